@@ -0,0 +1,198 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+import asyncio
+import random
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class AdmissionTimeout(Exception):
+    """No slot or retry fit before the request deadline"""
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to latency and overload (AIMD)
+
+    The limit grows by about one per limit's worth of fast successes and is
+    cut by decrease_factor on overload or when latency exceeds the target.
+    Waiters are admitted strictly in arrival order.
+    """
+
+    def __init__(self, initial_limit: float, min_limit: float, max_limit: float,
+                 latency_target: float, decrease_factor: float = 0.7):
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.decreases = 0
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    def _wake(self):
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot is handed over directly so later arrivals cannot take it
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self, deadline: float):
+        """Take a slot, waiting in line until the loop time reaches deadline"""
+        loop = asyncio.get_running_loop()
+        if not self._waiters and self._has_capacity():
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=max(0.0, deadline - loop.time()))
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we gave up, pass it on
+                self.in_flight -= 1
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionTimeout("Timed out waiting for a concurrency slot") from None
+            raise
+        self.admitted += 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False):
+        """Return a slot and adapt the limit to how the call went"""
+        self.in_flight -= 1
+        if overloaded or (latency is not None and latency > self.latency_target):
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.decreases += 1
+        elif latency is not None:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limit and queue counters"""
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "decreases": self.decreases
+        }
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay asked for by a Retry-After or retry-after-ms response header"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class AdmissionController:
+    """Admission control for one upstream: adaptive limiter plus jittered retries
+
+    Every call has a deadline covering its time in the queue, each attempt
+    and the waits between retries. Retries honour Retry-After and otherwise
+    back off exponentially with full jitter.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter: AdaptiveLimiter,
+        retryable: Tuple[Type[BaseException], ...],
+        overload: Tuple[Type[BaseException], ...],
+        timeout: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_cap: float
+    ):
+        self.name = name
+        self.limiter = limiter
+        # Running out of time on an attempt is an overload signal as well
+        self.retryable = retryable + (asyncio.TimeoutError,)
+        self.overload = overload + (asyncio.TimeoutError,)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def _admit(self, fn: Callable[[], Awaitable[Any]], deadline: float) -> Tuple[Any, float]:
+        """Run fn in a slot, retrying as the deadline allows; the caller releases the slot"""
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            await self.limiter.acquire(deadline)
+            started = loop.time()
+            try:
+                result = await asyncio.wait_for(fn(), timeout=max(0.0, deadline - started))
+            except self.retryable as e:
+                self.limiter.release(overloaded=isinstance(e, self.overload))
+                error = e
+            except BaseException:
+                self.limiter.release()
+                raise
+            else:
+                return result, loop.time() - started
+
+            delay = self._backoff(attempt, error)
+            attempt += 1
+            if attempt > self.max_retries or loop.time() + delay >= deadline:
+                self.failures += 1
+                raise error
+            self.retries += 1
+            logger.warning(f"{self.name} call failed ({type(error).__name__}), retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Await fn() under admission control"""
+        deadline = asyncio.get_running_loop().time() + (timeout or self.timeout)
+        result, latency = await self._admit(fn, deadline)
+        self.limiter.release(latency)
+        return result
+
+    async def stream(self, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]], timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """Open a stream under admission control and hold its slot until it ends
+
+        Only opening the stream is retried, and its latency (time to the
+        response headers) is what adapts the limit.
+        """
+        deadline = asyncio.get_running_loop().time() + (timeout or self.timeout)
+        stream, latency = await self._admit(open_stream, deadline)
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            self.limiter.release(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return limiter and retry counters"""
+        return dict(self.limiter.stats(), name=self.name, retries=self.retries, failures=self.failures)
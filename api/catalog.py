@@ -0,0 +1,155 @@
+from typing import List, Dict, Any, Optional, Set, Iterable
+import asyncio
+import time
+import os
+from dotenv import load_dotenv
+import logging
+from api import search_clients
+from api.search_clients import run_search
+from api.retrieval import PRODUCT_SELECT_FIELDS
+from api.text_utils import turkish_casefold
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Catalog snapshot settings
+CATALOG_REFRESH_SECONDS = float(os.getenv('CATALOG_REFRESH_SECONDS', '600'))
+CATALOG_PAGE_SIZE = 1000  # Azure Search maximum for top
+
+class _TrieNode:
+    """Prefix trie node holding the ids of every document below it"""
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[str] = set()
+
+class CatalogSnapshot:
+    """Immutable in-memory copy of the product index with lookup structures"""
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.loaded_at = time.time()
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self._trie = _TrieNode()
+        self._by_color: Dict[str, Set[str]] = {}
+        self._search_keys: Dict[str, str] = {}
+
+        for document in documents:
+            product_id = document.get('id')
+            if not product_id:
+                continue
+            # The bulk load's constant @search.score would override the strategies' own scores
+            document = {key: value for key, value in document.items() if not key.startswith('@search.')}
+            self.by_id[product_id] = document
+
+            # Same fields the id:/name: prefix queries used
+            product_id_key = turkish_casefold(product_id)
+            name_key = turkish_casefold(document.get('name') or '')
+            for term in self._index_terms(product_id_key, name_key):
+                self._insert(term, product_id)
+            self._search_keys[product_id] = f"{product_id_key} {name_key}"
+
+            for color in document.get('color') or []:
+                self._by_color.setdefault(turkish_casefold(color), set()).add(product_id)
+
+    @staticmethod
+    def _index_terms(product_id_key: str, name_key: str) -> Iterable[str]:
+        yield product_id_key
+        yield from product_id_key.split('_')
+        yield from name_key.split()
+
+    def _insert(self, term: str, product_id: str):
+        node = self._trie
+        node.ids.add(product_id)
+        for char in term:
+            node = node.children.setdefault(char, _TrieNode())
+            node.ids.add(product_id)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Exact id lookup"""
+        return self.by_id.get(product_id)
+
+    def prefix_search(self, prefix: str) -> List[Dict[str, Any]]:
+        """Documents whose id or a name word starts with the prefix"""
+        node = self._trie
+        for char in turkish_casefold(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.by_id[product_id] for product_id in sorted(node.ids)]
+
+    def contains_search(self, text: str) -> List[Dict[str, Any]]:
+        """Documents whose id or name contains the text anywhere"""
+        needle = turkish_casefold(text)
+        return [self.by_id[product_id] for product_id, key in self._search_keys.items() if needle in key]
+
+    def color_search(self, colors: List[str]) -> List[Dict[str, Any]]:
+        """Documents available in any of the given colors"""
+        product_ids: Set[str] = set()
+        for color in colors:
+            product_ids |= self._by_color.get(turkish_casefold(color), set())
+        return [self.by_id[product_id] for product_id in sorted(product_ids)]
+
+# Current snapshot, replaced wholesale on every refresh
+snapshot: Optional[CatalogSnapshot] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+async def load_catalog() -> CatalogSnapshot:
+    """Load every product document from the search index into a new snapshot"""
+    global snapshot
+
+    documents = []
+    while True:
+        # Bulk paging is neither hedged nor bounded by the per-search timeout
+        page = await run_search(
+            search_clients.search_client,
+            guarded=False,
+            search_text="*",
+            select=PRODUCT_SELECT_FIELDS,
+            top=CATALOG_PAGE_SIZE,
+            skip=len(documents)
+        )
+        documents.extend(page)
+        if len(page) < CATALOG_PAGE_SIZE:
+            break
+
+    snapshot = CatalogSnapshot(documents)
+    logger.info(f"Catalog snapshot loaded with {len(snapshot)} products")
+    return snapshot
+
+async def _refresh_loop():
+    # A snapshot inherited from a preloading parent process is served until it is due
+    if snapshot is not None:
+        await asyncio.sleep(max(0.0, snapshot.loaded_at + CATALOG_REFRESH_SECONDS - time.time()))
+    while True:
+        try:
+            await load_catalog()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the previous snapshot
+            logger.error(f"Catalog refresh failed: {e}")
+        await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+
+def start_catalog_refresh():
+    """Start the periodic catalog refresh in the background"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def stop_catalog_refresh():
+    """Stop the periodic catalog refresh"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,109 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import os
+from dotenv import load_dotenv
+import logging
+from api.cache import TTLCache
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Conversation memory settings
+CONVERSATION_MEMORY_TURNS = int(os.getenv('CONVERSATION_MEMORY_TURNS', '10'))
+CONVERSATION_MEMORY_SESSIONS = int(os.getenv('CONVERSATION_MEMORY_SESSIONS', '10000'))
+CONVERSATION_MEMORY_TTL = float(os.getenv('CONVERSATION_MEMORY_TTL', '3600'))
+# Check the stored turn count on every read, for when other processes answer the same sessions
+CONVERSATION_MEMORY_VALIDATE = os.getenv('CONVERSATION_MEMORY_VALIDATE', 'false').lower() == 'true'
+
+class ConversationMemory:
+    """Recent turns per session, kept in a bounded LRU and loaded from storage on a miss
+
+    load_turns(session_id, limit) returns the session's last turns oldest
+    first. Turns are appended here as soon as an answer is ready, so the
+    memory stays ahead of the write-behind queue.
+
+    With validate, load_turn_count(session_id) is asked for the number of
+    stored turns on every read. A session is reloaded when storage holds
+    more turns than this process has seen, i.e. another worker answered
+    it. Turns still in that worker's write-behind queue are not visible.
+
+    Appended turns stay pinned until written(session_id) reports that their
+    queued write has landed, so an entry that expires or is evicted in the
+    meantime is restored from the pin instead of reloaded without them.
+    """
+
+    def __init__(
+        self,
+        load_turns: Callable[[str, int], Awaitable[List[Any]]],
+        max_turns: int = CONVERSATION_MEMORY_TURNS,
+        max_sessions: int = CONVERSATION_MEMORY_SESSIONS,
+        ttl: float = CONVERSATION_MEMORY_TTL,
+        load_turn_count: Optional[Callable[[str], Awaitable[int]]] = None,
+        validate: bool = CONVERSATION_MEMORY_VALIDATE
+    ):
+        self.load_turns = load_turns
+        self.load_turn_count = load_turn_count
+        self.validate = validate and load_turn_count is not None
+        self.max_turns = max_turns
+        self.stale_reloads = 0
+        # Entries are (recent turns, total turns this process knows the session has)
+        self._sessions = TTLCache("conversation", max_entries=max_sessions, ttl=ttl)
+        # Queued writes per session, and the entries held until they land
+        self._pending: Dict[str, int] = {}
+        self._pinned: Dict[str, tuple] = {}
+
+    async def get(self, session_id: str) -> List[Any]:
+        """Return the session's recent turns, oldest first"""
+        entry = self._sessions.get(session_id)
+        if entry is None and session_id in self._pinned:
+            entry = self._pinned[session_id]
+            self._sessions.set(session_id, entry)
+        stored = None
+        if self.validate:
+            try:
+                stored = await self.load_turn_count(session_id)
+            except Exception as e:
+                # Serve what memory has
+                logger.error(f"Error checking conversation for session {session_id}: {e}")
+            if entry is not None and stored is not None and stored > entry[1]:
+                self.stale_reloads += 1
+                entry = None
+
+        if entry is None:
+            try:
+                turns = tuple(await self.load_turns(session_id, self.max_turns))
+            except Exception as e:
+                # Answer without context rather than failing the request
+                logger.error(f"Error loading conversation for session {session_id}: {e}")
+                return []
+            entry = (turns, stored if stored is not None else len(turns))
+            # Storage is behind while writes are queued, do not keep what it returned
+            if session_id not in self._pending:
+                self._sessions.set(session_id, entry)
+        return list(entry[0])
+
+    def append(self, session_id: str, *turns: Any):
+        """Add finished turns to a session; call written() once their queued write lands"""
+        self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        current = self._sessions.peek(session_id) or self._pinned.get(session_id)
+        # Not in memory, the next get loads it from storage
+        if current is None:
+            return
+        entry = ((current[0] + turns)[-self.max_turns:], current[1] + len(turns))
+        self._sessions.set(session_id, entry)
+        self._pinned[session_id] = entry
+
+    def written(self, session_id: str):
+        """Release one queued write of the session, whether it was stored or failed"""
+        remaining = self._pending.get(session_id, 0) - 1
+        if remaining > 0:
+            self._pending[session_id] = remaining
+        else:
+            self._pending.pop(session_id, None)
+            self._pinned.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the memory's size and hit/miss counters"""
+        return dict(self._sessions.stats(), max_turns=self.max_turns, validate=self.validate, stale_reloads=self.stale_reloads, pending_sessions=len(self._pending))
@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, JSON
+from sqlalchemy import create_engine, inspect, Column, String, Text, DateTime, Integer, JSON, Index, UniqueConstraint
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -20,12 +23,60 @@ if not DATABASE_URL:
     # Fallback to local SQLite for development
     DATABASE_URL = "sqlite:///./chatbot.db"
 
+# Alembic configuration for the schema migrations
+ALEMBIC_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alembic.ini')
+# Revision matching the schema create_all built before migrations were added
+BASELINE_REVISION = '0001'
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+def engine_options(database_url: str) -> dict:
+    """Pool options for an engine, SQLite keeps its default pool"""
+    if make_url(database_url).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+def async_database_url(database_url: str) -> str:
+    """Map a sync database URL to its async driver (asyncpg or aiosqlite)"""
+    url = make_url(database_url.replace('postgres://', 'postgresql://', 1))
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        url = url.set(drivername='postgresql+asyncpg')
+        # asyncpg takes ssl instead of libpq's sslmode
+        if 'sslmode' in url.query:
+            query = dict(url.query)
+            query['ssl'] = query.pop('sslmode')
+            url = url.set(query=query)
+    elif backend == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url.render_as_string(hide_password=False)
+
 # Create engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session factory for use from async endpoints
+try:
+    async_engine = create_async_engine(async_database_url(DATABASE_URL), **engine_options(DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+except Exception as e:
+    logger.error(f"Async database engine unavailable: {e}")
+    async_engine = None
+    AsyncSessionLocal = None
+
 # Create base class for models
 Base = declarative_base()
 
@@ -34,20 +85,39 @@ class ChatSession(Base):
     __tablename__ = "chat_sessions"
     
     session_id = Column(String, primary_key=True, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     messages = Column(JSON, default=list)
+    # Legacy full history copy, conversations are now stored in conversation_turns
     conversation_history = Column(JSON, default=list)
+    turn_count = Column(Integer, default=0, server_default='0', nullable=False)
+
+class ConversationTurn(Base):
+    """One user or assistant turn of a conversation, in order"""
+    __tablename__ = "conversation_turns"
+    __table_args__ = (
+        UniqueConstraint('session_id', 'turn_index', name='uq_conversation_turns_session_turn'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    turn_index = Column(Integer, nullable=False)
+    role = Column(String, nullable=False)  # 'user' or 'assistant'
+    content = Column(Text)
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
 class ChatMessage(Base):
     """Individual chat message model"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index('ix_chat_messages_session_id_timestamp', 'session_id', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     session_id = Column(String, index=True)
     user_message = Column(Text)
     bot_response = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     message_id = Column(String, unique=True, index=True)
 
 class UserFeedback(Base):
@@ -58,30 +128,37 @@ class UserFeedback(Base):
     session_id = Column(String, index=True)
     rating = Column(String)  # 'like' or 'dislike'
     feedback_text = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    # Legacy full history copy, new feedback points at turns [turn_start, turn_end)
     conversation_history = Column(JSON, default=list)
+    turn_start = Column(Integer)
+    turn_end = Column(Integer)
     feedback_id = Column(String, unique=True, index=True)
 
-# Database dependency
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
+# Async database dependency
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Get async database session"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database engine is not available")
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Create tables
 def create_tables():
-    """Create all database tables"""
+    """Create or upgrade all database tables by running the Alembic migrations"""
     try:
-        Base.metadata.create_all(bind=engine)
+        from alembic import command
+        from alembic.config import Config
+        
+        config = Config(ALEMBIC_CONFIG)
+        with engine.begin() as connection:
+            config.attributes['connection'] = connection
+            tables = inspect(connection).get_table_names()
+            # Databases created before migrations existed start at the baseline
+            if 'chat_sessions' in tables and 'alembic_version' not in tables:
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, 'head')
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
-        raise
-
-# Initialize database
-def init_db():
-    """Initialize database"""
-    create_tables()
\ No newline at end of file
+        raise
\ No newline at end of file
@@ -1,23 +1,51 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator, Set, Tuple
 import os
 from dotenv import load_dotenv
 import openai
-from openai import AzureOpenAI
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
+from openai import AsyncAzureOpenAI
 import json
+import base64
+import csv
+import io
+import asyncio
+import bisect
+import hashlib
+import itertools
+import time
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from api.database import get_db, init_db, ChatSession, ChatMessage as DBChatMessage, UserFeedback
+from api.database import get_async_db, async_engine, AsyncSessionLocal, ChatSession, ConversationTurn, ChatMessage as DBChatMessage, UserFeedback
+from api import search_clients
+from api.search_clients import run_search
+from api.retrieval import run_plan, ProductHit, PRODUCT_SELECT_FIELDS
+from api import catalog
+from api import policy_index
+from api.policy_index import POLICY_SELECT_FIELDS
+from api.cache import TTLCache
+from api.text_utils import normalize_query, turkish_casefold
+from api.query_classifier import classify_query
+from api.persistence import WriteBehindQueue
+from api.session_store import session_store
+from api.record_store import SegmentedRecordStore
+from api.conversation_memory import ConversationMemory
+from api.prompt_builder import PromptBuilder
+from api.model_routing import ModelRouter, Route
+from api.single_flight import SingleFlight
+from api.admission import AdmissionController, AdaptiveLimiter
+from api import metrics
+from api import startup
 
 # Load environment variables
 load_dotenv()
@@ -26,50 +54,112 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="MFT Leather Chatbot API", version="1.0.0")
+# Configure Azure OpenAI
+AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
+AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
+AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION', '2025-01-01-preview')
+
+# Created on first use so importing the app needs neither credentials nor an HTTP client
+_openai_client: Optional[AsyncAzureOpenAI] = None
+
+def get_openai_client() -> AsyncAzureOpenAI:
+    """Return the shared Azure OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        # Retries are done by the admission controller, which can see the request deadline
+        _openai_client = AsyncAzureOpenAI(
+            api_key=AZURE_OPENAI_API_KEY,
+            api_version=AZURE_OPENAI_API_VERSION,
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            max_retries=0
+        )
+    return _openai_client
+
+# Admission control in front of the completion calls: queue briefly under load instead of failing
+openai_admission = AdmissionController(
+    "openai",
+    AdaptiveLimiter(
+        initial_limit=float(os.getenv('OPENAI_CONCURRENCY_INITIAL', '8')),
+        min_limit=float(os.getenv('OPENAI_CONCURRENCY_MIN', '1')),
+        max_limit=float(os.getenv('OPENAI_CONCURRENCY_MAX', '64')),
+        latency_target=float(os.getenv('OPENAI_LATENCY_TARGET', '20'))
+    ),
+    retryable=(openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError),
+    overload=(openai.RateLimitError, openai.APITimeoutError),
+    timeout=float(os.getenv('OPENAI_REQUEST_DEADLINE', '45')),
+    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '3')),
+    backoff_base=float(os.getenv('OPENAI_BACKOFF_BASE', '0.5')),
+    backoff_cap=float(os.getenv('OPENAI_BACKOFF_CAP', '8'))
+)
 
-# Initialize database
-try:
-    init_db()
-    logger.info("Database initialized successfully")
-except Exception as e:
-    logger.error(f"Database initialization failed: {e}")
-    # Continue without database for backward compatibility
+# Background resources: async Azure Search clients, catalog refresh, write-behind queue
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the schema and background workers, then drain and close everything on shutdown
+
+    The catalog and policy index load in the background, or are inherited
+    already loaded from a preloading gunicorn master, so startup does not
+    wait on Azure Search.
+    """
+    with startup.timed('lifespan'):
+        if startup.DB_MIGRATE_ON_STARTUP:
+            try:
+                await asyncio.to_thread(startup.migrate_database)
+            except Exception as e:
+                # Continue without database for backward compatibility
+                logger.error(f"Database initialization failed: {e}")
+        await search_clients.open_search_clients()
+        catalog.start_catalog_refresh()
+        policy_index.start_policy_refresh()
+        persistence_queue.start()
+        session_store.start_compaction()
+        await asyncio.to_thread(startup.load_process_data)
+
+    yield
+
+    # Let streamed completions finish so their turns reach the write-behind queue
+    if stream_tasks:
+        await asyncio.gather(*stream_tasks, return_exceptions=True)
+    await persistence_queue.stop()
+    await session_store.stop_compaction()
+    await catalog.stop_catalog_refresh()
+    await policy_index.stop_policy_refresh()
+    await search_clients.close_search_clients()
+    if _openai_client is not None:
+        await _openai_client.close()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+app = FastAPI(title="MFT Leather Chatbot API", version="1.0.0", lifespan=lifespan)
 
 # Mount static files
 import os
 static_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# Azure Search configuration
-AZURE_SEARCH_ENDPOINT = os.getenv('AZURE_SEARCH_ENDPOINT')
-AZURE_SEARCH_KEY = os.getenv('AZURE_SEARCH_API_KEY')
-AZURE_SEARCH_INDEX = os.getenv('AZURE_SEARCH_INDEX', 'mftleather')
-POLICY_SEARCH_INDEX = 'policy'
+# Retrieval cache in front of search_products, keyed on the normalized query
+retrieval_cache = TTLCache(
+    "retrieval",
+    max_entries=int(os.getenv('RETRIEVAL_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.getenv('RETRIEVAL_CACHE_PRODUCT_TTL', '300'))
+)
+RETRIEVAL_CACHE_POLICY_TTL = float(os.getenv('RETRIEVAL_CACHE_POLICY_TTL', '3600'))
 
-# Configure Azure OpenAI
-AZURE_OPENAI_API_KEY = os.getenv('AZURE_OPENAI_API_KEY')
-AZURE_OPENAI_ENDPOINT = os.getenv('AZURE_OPENAI_ENDPOINT')
-AZURE_OPENAI_API_VERSION = os.getenv('AZURE_OPENAI_API_VERSION', '2025-01-01-preview')
+# Policy chunks are ranked in-process; Azure Search can re-rank the local candidates
+POLICY_AZURE_RERANK = os.getenv('POLICY_AZURE_RERANK', 'false').lower() == 'true'
 
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT
+# Answer cache for policy/FAQ responses that do not depend on conversation context
+answer_cache = TTLCache(
+    "answer",
+    max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '512')),
+    ttl=float(os.getenv('ANSWER_CACHE_TTL', '21600'))
 )
 
-# Initialize Azure Search clients
-search_client = SearchClient(
-    endpoint=AZURE_SEARCH_ENDPOINT,
-    index_name=AZURE_SEARCH_INDEX,
-    credential=AzureKeyCredential(AZURE_SEARCH_KEY)
-)
+# Identical concurrent searches and stateless answers share one upstream call
+search_flight = SingleFlight("search")
+answer_flight = SingleFlight("answer")
 
-policy_search_client = SearchClient(
-    endpoint=AZURE_SEARCH_ENDPOINT,
-    index_name=POLICY_SEARCH_INDEX,
-    credential=AzureKeyCredential(AZURE_SEARCH_KEY)
-)
+CHAT_ERROR_RESPONSE = "Üzgünüm, şu anda size yardımcı olamıyorum. Lütfen daha sonra tekrar deneyin. 😔"
 
 class ChatMessage(BaseModel):
     role: str
@@ -77,8 +167,10 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    # Only needed without a session_id, sessions use the server-side memory
     conversation_history: Optional[List[ChatMessage]] = []
     session_id: Optional[str] = None
+    bypass_cache: Optional[bool] = False
 
 class ChatResponse(BaseModel):
     response: str
@@ -105,74 +197,320 @@ async def serve_chatbot():
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """Main chat endpoint that processes user messages"""
+    started = time.perf_counter()
     try:
         logger.info(f"Received message: {request.message}")
         
         # Search for relevant products
         products = await search_products(request.message)
+        history = await metrics.stage_seconds.timed(conversation_for(request), stage="conversation_load")
         
         # Generate response using OpenAI
         response = await generate_chat_response(
             request.message, 
-            request.conversation_history, 
-            products
+            history, 
+            products,
+            use_answer_cache=not request.bypass_cache
         )
         
-        # Save message to session if session_id is provided
-        if request.session_id:
-            message_data = {
-                "user_message": request.message,
-                "bot_response": response,
-                "conversation_history": [msg.dict() for msg in request.conversation_history] if request.conversation_history else []
-            }
-            save_to_session_db(request.session_id, message_data, 'message')
+        # Queue message for the session if session_id is provided
+        await metrics.stage_seconds.timed(save_chat_turn(request, response), stage="persist_enqueue")
         
+        metrics.request_seconds.observe(time.perf_counter() - started, endpoint="chat")
         return ChatResponse(
             response=response,
-            products_found=products
+            products_found=[product.to_dict() for product in products]
         )
         
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
+        metrics.errors.inc(stage="chat")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-async def search_products(query: str) -> List[Dict[str, Any]]:
+# Streamed completions still running, finished and persisted even if their client has gone
+stream_tasks: Set[asyncio.Task] = set()
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Streaming chat endpoint, sends products first and then tokens as NDJSON events"""
+    started = time.perf_counter()
+    try:
+        logger.info(f"Received streaming message: {request.message}")
+        
+        # Search for relevant products
+        products = await search_products(request.message)
+        history = await metrics.stage_seconds.timed(conversation_for(request), stage="conversation_load")
+        
+    except Exception as e:
+        logger.error(f"Chat stream endpoint error: {str(e)}")
+        metrics.errors.inc(stage="chat_stream")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    response_parts = []
+    tokens: asyncio.Queue = asyncio.Queue()
+    
+    async def generate():
+        # Runs apart from the response so a client that disconnects does not lose the paid-for turn
+        try:
+            async for token in stream_chat_response(request.message, history, products, use_answer_cache=not request.bypass_cache):
+                response_parts.append(token)
+                tokens.put_nowait(token)
+        finally:
+            tokens.put_nowait(None)
+        if response_parts:
+            try:
+                await save_chat_turn(request, "".join(response_parts).strip())
+            except Exception as e:
+                logger.error(f"Error saving streamed chat turn: {e}")
+    
+    task = asyncio.create_task(generate())
+    stream_tasks.add(task)
+    task.add_done_callback(stream_tasks.discard)
+    
+    async def event_stream():
+        yield json.dumps({"type": "products", "products_found": [product.to_dict() for product in products]}, ensure_ascii=False, default=str) + "\n"
+        
+        while (token := await tokens.get()) is not None:
+            yield json.dumps({"type": "token", "content": token}, ensure_ascii=False) + "\n"
+        
+        yield json.dumps({"type": "done", "response": "".join(response_parts).strip()}, ensure_ascii=False) + "\n"
+        metrics.request_seconds.observe(time.perf_counter() - started, endpoint="chat_stream")
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+async def load_conversation_turns(session_id: str, limit: int) -> List[ChatMessage]:
+    """Load a session's last turns from the database, oldest first"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database engine is not available")
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(ConversationTurn.role, ConversationTurn.content)
+            .where(ConversationTurn.session_id == session_id)
+            .order_by(ConversationTurn.turn_index.desc())
+            .limit(limit)
+        )).all()
+    return [ChatMessage(role=row.role, content=row.content or '') for row in reversed(rows)]
+
+async def load_turn_count(session_id: str) -> int:
+    """Number of turns stored for a session"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database engine is not available")
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(
+            select(ChatSession.turn_count).where(ChatSession.session_id == session_id)
+        )).scalar() or 0
+
+# Recent turns per session, so clients only send the new message
+conversation_memory = ConversationMemory(load_conversation_turns, load_turn_count=load_turn_count)
+
+async def conversation_for(request: ChatRequest) -> List[ChatMessage]:
+    """History for a request, from the server-side memory when it has a session"""
+    if request.session_id:
+        return await conversation_memory.get(request.session_id)
+    return request.conversation_history or []
+
+async def save_chat_turn(request: ChatRequest, response: str):
+    """Queue a finished chat turn for the session if session_id is provided"""
+    if request.session_id:
+        conversation_memory.append(
+            request.session_id,
+            ChatMessage(role='user', content=request.message),
+            ChatMessage(role='assistant', content=response)
+        )
+        message_data = {
+            "user_message": request.message,
+            "bot_response": response,
+            "timestamp_utc": datetime.utcnow()
+        }
+        await persistence_queue.put((request.session_id, message_data, 'message'))
+
+async def search_by_ids(product_ids: List[str]) -> List[ProductHit]:
+    """Strategy 0/0.1: exact id lookups for known products"""
+    snapshot = catalog.snapshot
+    if snapshot is not None:
+        documents = [snapshot.get(product_id) for product_id in product_ids]
+        return [ProductHit.from_document(document, 1.0) for document in documents if document is not None]
+    
+    batches = await asyncio.gather(*[
+        run_search(
+            search_clients.search_client,
+            select=PRODUCT_SELECT_FIELDS,
+            search_text="",
+            filter=f"id eq '{product_id}'",
+            top=5
+        )
+        for product_id in product_ids
+    ])
+    return [ProductHit.from_document(result, 1.0) for batch in batches for result in batch]
+
+async def search_partial(query_words: List[str]) -> List[ProductHit]:
+    """Strategy 0.2: prefix matching on id and name, with a contains fallback"""
+    words = [word for word in query_words if len(word) >= 3]  # Only search for words with 3+ characters
+    if not words:
+        return []
+
+    # Answer from the catalog snapshot when it is loaded
+    snapshot = catalog.snapshot
+    if snapshot is not None:
+        search_results = [ProductHit.from_document(document, 0.8) for word in words for document in snapshot.prefix_search(word)]
+        if not search_results:
+            search_results = [ProductHit.from_document(document, 0.6) for word in words for document in snapshot.contains_search(word)]
+        return search_results
+
+    # Search in both ID and name fields with wildcards, all words at once
+    batches = await asyncio.gather(*[
+        run_search(
+            search_clients.search_client,
+            select=PRODUCT_SELECT_FIELDS,
+            search_text=f"id:{word}* OR name:{word}*",
+            top=10,
+            search_mode='any'
+        )
+        for word in words
+    ])
+    search_results = [ProductHit.from_document(result, 0.8) for batch in batches for result in batch]
+
+    # If still no results, try contains search (less strict)
+    if not search_results:
+        batches = await asyncio.gather(*[
+            run_search(
+                search_clients.search_client,
+                select=PRODUCT_SELECT_FIELDS,
+                search_text=f"search.ismatch('{word}', 'id,name')",
+                top=5
+            )
+            for word in words
+        ])
+        search_results = [ProductHit.from_document(result, 0.6) for batch in batches for result in batch]
+
+    return search_results
+
+async def search_identity(product_ids: List[str], query_words: List[str]) -> List[ProductHit]:
+    """Strategy 0 to 0.2: id lookups, falling back to partial matching when nothing is found"""
+    search_results = await search_by_ids(product_ids) if product_ids else []
+    if not search_results:
+        search_results = await search_partial(query_words)
+    return search_results
+
+async def search_full_text(query: str) -> List[ProductHit]:
+    """Strategy 1: simple text search, falling back to a broad search"""
+    try:
+        results = await run_search(
+            search_clients.search_client,
+            select=PRODUCT_SELECT_FIELDS,
+            search_text=query,
+            top=10,
+            search_mode='any'
+        )
+    except Exception as e:
+        # Search is unavailable and nothing was cached, match words against the local catalog
+        snapshot = catalog.snapshot
+        if snapshot is None:
+            raise
+        logger.warning(f"Full-text search unavailable ({type(e).__name__}), using the catalog snapshot")
+        metrics.fallbacks.inc(kind="search_catalog")
+        words = [word for word in query.split() if len(word) >= 3]
+        return [ProductHit.from_document(document, 0) for word in words for document in snapshot.contains_search(word)][:10]
+
+    # If no results, try broader search
+    if not results:
+        results = await run_search(
+            search_clients.search_client,
+            select=PRODUCT_SELECT_FIELDS,
+            search_text="*",
+            top=10
+        )
+
+    return [ProductHit.from_document(result, 0) for result in results]
+
+async def search_color(query: str, variants: List[str]) -> List[ProductHit]:
+    """Strategy 2: text search filtered to the color variants"""
+    # The catalog color index finds the same products without a round-trip;
+    # text ranking for them comes from the full-text strategy
+    snapshot = catalog.snapshot
+    if snapshot is not None:
+        return [ProductHit.from_document(document, 0) for document in snapshot.color_search(variants)]
+    
+    color_filter = ' or '.join([f"color/any(c: c eq '{variant}')" for variant in variants])
+
+    color_results = await run_search(
+        search_clients.search_client,
+        select=PRODUCT_SELECT_FIELDS,
+        search_text=query,
+        filter=color_filter,
+        top=10
+    )
+
+    return [ProductHit.from_document(result, 0) for result in color_results]
+
+async def search_policies(query: str) -> List[Dict[str, Any]]:
+    """Strategy -1: policy chunks ranked by the local BM25 index, or by Azure Search until it is loaded"""
+    local_index = policy_index.index
+    if local_index is None:
+        return await run_search(
+            search_clients.policy_search_client,
+            search_text=query,
+            select=POLICY_SELECT_FIELDS,
+            top=5,
+            search_mode='any'
+        )
+    
+    local_results = [dict(document, **{'@search.score': score}) for score, document in local_index.search(query, top=5)]
+    if not local_results or not POLICY_AZURE_RERANK:
+        return local_results
+    
+    try:
+        reranked = await run_search(
+            search_clients.policy_search_client,
+            search_text=query,
+            select=POLICY_SELECT_FIELDS,
+            filter=f"search.in(id, '{'|'.join(result['id'] for result in local_results)}', '|')",
+            top=len(local_results),
+            search_mode='any'
+        )
+    except Exception as e:
+        logger.warning(f"Policy re-ranking unavailable ({type(e).__name__}), using the local ranking")
+        return local_results
+    
+    # Candidates Azure did not score keep their local order after the re-ranked ones
+    reranked_ids = {result.get('id') for result in reranked}
+    return reranked + [result for result in local_results if result['id'] not in reranked_ids]
+
+async def search_products(query: str) -> List[ProductHit]:
+    """Search for products and policies, serving repeated queries from the retrieval cache"""
+    cache_key = normalize_query(query)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    
+    # Concurrent misses for the same query share one search
+    search_results = await search_flight.do(
+        cache_key, lambda: metrics.stage_seconds.timed(search_products_uncached(query), stage="search")
+    )
+    
+    # Empty results may come from a failed search, so only cache hits
+    if search_results:
+        is_policy = search_results[0].type == 'policy'
+        retrieval_cache.set(cache_key, search_results, ttl=RETRIEVAL_CACHE_POLICY_TTL if is_policy else None)
+    
+    return list(search_results)
+
+async def search_products_uncached(query: str) -> List[ProductHit]:
     """Search for products and policies using Azure Search"""
     try:
         # Enhanced search with multiple strategies
         search_results = []
-        query_lower = query.lower()
         
-        # Check if query is policy-related (SSS, iade, garanti, etc.)
-        policy_keywords = ['sss', 'iade', 'garanti', 'değişim', 'kargo', 'ödeme', 'taksit', 'nakit', 'kredi kartı', 
-                          'üretim', 'teslimat', 'bakım', 'temizlik', 'mağaza', 'adres', 'telefon', 'fiyat',
-                          'kişiselleştirme', 'isim', 'yazı', 'logo', 'promosyon', 'indirim']
-        
-        is_policy_query = any(keyword in query_lower for keyword in policy_keywords)
+        # Classify the query (policy, product id/name, color) in one pass
+        with metrics.stage_seconds.time(stage="classify"):
+            intents = classify_query(query)
         
         # Strategy -1: Policy search for FAQ and return policy questions
-        if is_policy_query:
+        if intents.is_policy:
             try:
-                policy_results = policy_search_client.search(
-                    search_text=query,
-                    top=5,
-                    search_mode='any'
-                )
+                policy_results = await metrics.stage_seconds.timed(search_policies(query), stage="search.policy")
                 
-                for result in policy_results:
-                    search_results.append({
-                        'id': result.get('id', ''),
-                        'title': 'SSS ve İade Politikası',
-                        'brand': 'MFT Leather',
-                        'description': result.get('chunk', ''),
-                        'text': result.get('chunk', ''),
-                        'price': '',
-                        'color': [],
-                        'category': 'policy',
-                        'url': '',
-                        'score': result.get('@search.score', 1.0),
-                        'type': 'policy'
-                    })
+                search_results = [ProductHit.policy(result) for result in policy_results]
                 
                 # If policy results found, return them with higher priority
                 if search_results:
@@ -180,190 +518,35 @@ async def search_products(query: str) -> List[Dict[str, Any]]:
                     
             except Exception as policy_error:
                 logger.warning(f"Policy search error: {str(policy_error)}")
+                metrics.errors.inc(stage="search.policy")
                 # Continue with product search if policy search fails
         
-        # Strategy 0: Specific product ID search for known products
-        if 'vineda 5696' in query_lower or 'vineda5696' in query_lower:
-            specific_results = search_client.search(
-                search_text="",
-                filter="id eq 'vineda_5696'",
-                top=5
-            )
-            for result in specific_results:
-                search_results.append({
-                    'id': result.get('id', ''),
-                    'title': result.get('name', ''),
-                    'brand': result.get('brand', ''),
-                    'description': result.get('description', ''),
-                    'text': result.get('text', ''),
-                    'price': result.get('price', ''),
-                    'color': result.get('color', []),
-                    'category': result.get('category', ''),
-                    'url': result.get('url', ''),
-                    'score': result.get('@search.score', 1.0)
-                })
-        
-        # Strategy 0.1: Product name-based search for common models
-        product_mappings = {
-            'retro': 'retro_2660',
-            'vineda': 'vineda_5696'
-        }
+        # Work out which product strategies apply; independent ones run concurrently
+        plan = []
         
-        for product_name, product_id in product_mappings.items():
-            if product_name in query_lower:
-                name_results = search_client.search(
-                    search_text="",
-                    filter=f"id eq '{product_id}'",
-                    top=5
-                )
-                for result in name_results:
-                    # Avoid duplicates
-                    if not any(r['id'] == result.get('id', '') for r in search_results):
-                        search_results.append({
-                            'id': result.get('id', ''),
-                            'title': result.get('name', ''),
-                            'brand': result.get('brand', ''),
-                            'description': result.get('description', ''),
-                            'text': result.get('text', ''),
-                            'price': result.get('price', ''),
-                            'color': result.get('color', []),
-                            'category': result.get('category', ''),
-                            'url': result.get('url', ''),
-                            'score': result.get('@search.score', 1.0)
-                        })
-                break  # Stop after first match to avoid multiple results for same query
-        
-        # Strategy 0.2: Enhanced partial matching - search in both ID and name fields
-        if not search_results:  # Only if no results found yet
-            query_words = query_lower.split()
-            for word in query_words:
-                if len(word) >= 3:  # Only search for words with 3+ characters
-                    # Search in both ID and name fields with wildcards
-                    partial_results = search_client.search(
-                        search_text=f"id:{word}* OR name:{word}*",
-                        top=10,
-                        search_mode='any'
-                    )
-                    for result in partial_results:
-                        if not any(r['id'] == result.get('id', '') for r in search_results):
-                            search_results.append({
-                                'id': result.get('id', ''),
-                                'title': result.get('name', ''),
-                                'brand': result.get('brand', ''),
-                                'description': result.get('description', ''),
-                                'text': result.get('text', ''),
-                                'price': result.get('price', ''),
-                                'color': result.get('color', []),
-                                'category': result.get('category', ''),
-                                'url': result.get('url', ''),
-                                'score': result.get('@search.score', 0.8)  # Higher score for partial matches
-                            })
-                    if search_results:  # Stop after finding results
-                        break
-            
-            # If still no results, try contains search (less strict)
-            if not search_results:
-                for word in query_words:
-                    if len(word) >= 3:
-                        contains_results = search_client.search(
-                            search_text=f"search.ismatch('{word}', 'id,name')",
-                            top=5
-                        )
-                        for result in contains_results:
-                            if not any(r['id'] == result.get('id', '') for r in search_results):
-                                search_results.append({
-                                    'id': result.get('id', ''),
-                                    'title': result.get('name', ''),
-                                    'brand': result.get('brand', ''),
-                                    'description': result.get('description', ''),
-                                    'text': result.get('text', ''),
-                                    'price': result.get('price', ''),
-                                    'color': result.get('color', []),
-                                    'category': result.get('category', ''),
-                                    'url': result.get('url', ''),
-                                    'score': result.get('@search.score', 0.6)
-                                })
-                        if search_results:
-                            break
+        # Strategy 0/0.1: Specific product ID and product name matches, then
+        # Strategy 0.2 which runs only when the id lookups find nothing
+        plan.append(("identity", metrics.stage_seconds.timed(
+            search_identity(intents.product_ids, turkish_casefold(query).split()), stage="search.identity"
+        )))
         
         # Strategy 1: Simple text search with correct field names
-        results = search_client.search(
-            search_text=query,
-            top=10,
-            search_mode='any'
-        )
-        
-        # If no results, try broader search
-        if not list(results):
-            results = search_client.search(
-                search_text="*",
-                top=10
-            )
-        
-        for result in results:
-            search_results.append({
-                'id': result.get('id', ''),
-                'title': result.get('name', ''),  # Product name
-                'brand': result.get('brand', ''),  # Brand information
-                'description': result.get('description', ''),  # Full detailed description
-                'text': result.get('text', ''),  # Short summary text
-                'price': result.get('price', ''),
-                'color': result.get('color', []),
-                'category': result.get('category', ''),
-                'url': result.get('url', ''),
-                'score': result.get('@search.score', 0)
-            })
+        plan.append(("full_text", metrics.stage_seconds.timed(search_full_text(query), stage="search.full_text")))
         
         # Strategy 2: Color-specific search if color keywords detected
-        color_keywords = {
-            'siyah': ['Flother Mat Siyah', 'Napa Siyah', 'Tiguan Siyah', 'Flother Siyah'],
-            'pembe': ['Flother Mat Pembe', 'Vineda Pembe', 'Napa Pembe'],
-            'kahverengi': ['Flother Mat Kahverengi', 'Napa Kahverengi', 'Tiguan Kahverengi'],
-            'beyaz': ['Flother Mat Beyaz', 'Napa Beyaz'],
-            'mavi': ['Flother Mat Mavi', 'Napa Mavi']
-        }
+        for color, variants in intents.colors.items():
+            plan.append((f"color:{color}", metrics.stage_seconds.timed(search_color(query, variants), stage="search.color")))
         
-        query_lower = query.lower()
-        for color, variants in color_keywords.items():
-            if color in query_lower:
-                color_filter = ' or '.join([f"color/any(c: c eq '{variant}')" for variant in variants])
-                
-                color_results = search_client.search(
-                    search_text=query,
-                    filter=color_filter,
-                    top=10
-                )
-                
-                for result in color_results:
-                    # Avoid duplicates
-                    if not any(r['id'] == result.get('id', '') for r in search_results):
-                        search_results.append({
-                            'id': result.get('id', ''),
-                            'title': result.get('name', ''),  # Fixed: name instead of title
-                            'description': result.get('text', ''),  # Fixed: text instead of description
-                            'price': result.get('price', ''),
-                            'color': result.get('color', []),
-                            'category': result.get('category', ''),
-                            'url': result.get('url', ''),
-                            'score': result.get('@search.score', 0)
-                        })
-        
-        # Sort by relevance score and return top 5
-        search_results.sort(key=lambda x: x['score'], reverse=True)
+        # Merge and dedupe by id, sort by relevance score and return top 5
+        search_results = await run_plan(plan)
         return search_results[:5]
         
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
+        metrics.errors.inc(stage="search")
         return []
 
-async def generate_chat_response(message: str, history: List[ChatMessage], products: List[Dict[str, Any]]) -> str:
-    """Generate chat response using OpenAI"""
-    try:
-        # Build conversation context
-        messages = [
-            {
-                "role": "system",
-                "content": """
+SYSTEM_PROMPT = """
 Sen MFT Leather'ın satış odaklı müşteri hizmetleri asistanısın. 😊
 
 YANIT STİLİ VE FORMATLAMA:
@@ -405,68 +588,307 @@ DİL VE FORMAT:
 
 Müşterinin sorusuna DOĞRUDAN cevap ver, sonra uygun teşviki ekle.
 """
-            }
-        ]
-        
-        # Add conversation history (last 5 messages)
-        for msg in history[-10:]:
-            messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
-        
-        # Add current message with detailed product/policy context
-        product_context = ""
-        if products:
-            # Check if results contain policy information
-            has_policy = any(product.get('type') == 'policy' for product in products)
-            
-            if has_policy:
-                product_context = "\n\nBulunan policy bilgileri:\n"
-                for i, product in enumerate(products[:3], 1):
-                    if product.get('type') == 'policy':
-                        description = product.get('description', product.get('text', 'Bilgi yok'))
-                        product_context += f"""{i}. {description}\n\n"""
-            else:
-                product_context = "\n\nBulunan ürünler (detaylı bilgiler):\n"
-                for i, product in enumerate(products[:3], 1):
-                    colors = ", ".join(product['color']) if product['color'] else "Renk bilgisi yok"
-                    brand = product.get('brand', 'Marka bilgisi yok')
-                    category = product.get('category', 'Kategori bilgisi yok')
-                    description = product.get('description', product.get('text', 'Açıklama yok'))
-                    
-                    product_context += f"""{i}. {product['title']}
-   Marka: {brand}
-   Kategori: {category}
-   Renkler: {colors}
-   Fiyat: {product['price'] if product['price'] else 'Fiyat bilgisi için mağazamızı arayın'}
-   Detaylar: {description[:300]}{'...' if len(description) > 300 else ''}
-\n"""
-        
-        messages.append({
-            "role": "user",
-            "content": f"{message}{product_context}"
-        })
+
+# Cached answers are only valid for the prompt that produced them
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+
+# Counts the system prompt once and fits each request into the input token budget
+prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+
+# Deployment, max_tokens and temperature by intent
+model_router = ModelRouter()
+
+def route_for(message: str, products: List[ProductHit]) -> Route:
+    """Pick the model route for a message and the context retrieved for it"""
+    return model_router.route(classify_query(message), products)
+
+def build_chat_messages(message: str, history: List[ChatMessage], products: List[ProductHit]) -> List[Dict[str, str]]:
+    """Build the OpenAI message list from history and product/policy context"""
+    return prompt_builder.build(message, history, products)
+
+def has_prior_context(message: str, history: List[ChatMessage]) -> bool:
+    """Whether the history holds anything besides the current message"""
+    # Clients without a session include the current message at the end of their history
+    context = list(history or [])
+    if context and context[-1].role == 'user' and context[-1].content == message:
+        context = context[:-1]
+    return bool(context)
+
+def answer_cache_key(message: str, history: List[ChatMessage], products: List[ProductHit], route: Route) -> Optional[tuple]:
+    """Build the answer cache key, or None if the answer may depend on context"""
+    # Only grounded policy answers are reusable across users
+    if not products or any(product.type != 'policy' for product in products):
+        return None
+    if has_prior_context(message, history):
+        return None
+    
+    chunk_ids = tuple(sorted(product.id for product in products))
+    # The route carries the deployment and sampling settings, so a changed route does not serve old answers
+    return (normalize_query(message), chunk_ids, SYSTEM_PROMPT_VERSION, route)
+
+def answer_flight_key(message: str, history: List[ChatMessage], products: List[ProductHit], use_answer_cache: bool) -> Optional[tuple]:
+    """Key under which identical stateless answers are generated once, or None"""
+    if has_prior_context(message, history):
+        return None
+    product_ids = tuple(product.id for product in products)
+    return (normalize_query(message), product_ids, use_answer_cache)
+
+async def generate_chat_response(message: str, history: List[ChatMessage], products: List[ProductHit], use_answer_cache: bool = True) -> str:
+    """Generate chat response using OpenAI, sharing one call between identical stateless requests"""
+    flight_key = answer_flight_key(message, history, products, use_answer_cache)
+    if flight_key is None:
+        return await _generate_chat_response(message, history, products, use_answer_cache)
+    return await answer_flight.do(flight_key, lambda: _generate_chat_response(message, history, products, use_answer_cache))
+
+async def stream_chat_response(message: str, history: List[ChatMessage], products: List[ProductHit], use_answer_cache: bool = True) -> AsyncIterator[str]:
+    """Stream chat response tokens, sharing one stream between identical stateless requests"""
+    flight_key = answer_flight_key(message, history, products, use_answer_cache)
+    if flight_key is None:
+        stream = _stream_chat_response(message, history, products, use_answer_cache)
+    else:
+        stream = answer_flight.stream(flight_key, lambda: _stream_chat_response(message, history, products, use_answer_cache))
+    async for token in stream:
+        yield token
+
+async def _generate_chat_response(message: str, history: List[ChatMessage], products: List[ProductHit], use_answer_cache: bool = True) -> str:
+    """Generate chat response using OpenAI"""
+    route = route_for(message, products)
+    cache_key = answer_cache_key(message, history, products, route) if use_answer_cache else None
+    if cache_key is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    try:
+        with metrics.stage_seconds.time(stage="prompt_build"):
+            messages = build_chat_messages(message, history, products)
         
         # Generate response
-        response = client.chat.completions.create(
-            model="gpt-4",
+        started = time.perf_counter()
+        response = await openai_admission.call(lambda: get_openai_client().chat.completions.create(
+            model=route.deployment,
             messages=messages,
-            max_tokens=800,  # Increased to prevent cut-off responses
-            temperature=0.7
-        )
+            max_tokens=route.max_tokens,
+            temperature=route.temperature
+        ))
+        latency = time.perf_counter() - started
+        metrics.stage_seconds.observe(latency, stage="openai")
+        metrics.stage_seconds.observe(latency, stage=f"openai.{route.name}")
         
-        return response.choices[0].message.content.strip()
+        usage = response.usage
+        prompt_tokens, completion_tokens = (usage.prompt_tokens, usage.completion_tokens) if usage is not None else (0, 0)
+        metrics.tokens.observe(prompt_tokens, kind="prompt")
+        metrics.tokens.observe(completion_tokens, kind="completion")
+        model_router.record(route, latency, prompt_tokens, completion_tokens)
+        answer = response.choices[0].message.content.strip()
+        if cache_key is not None:
+            answer_cache.set(cache_key, answer)
+        return answer
         
     except Exception as e:
         logger.error(f"OpenAI API error: {str(e)}")
-        return "Üzgünüm, şu anda size yardımcı olamıyorum. Lütfen daha sonra tekrar deneyin. 😔"
+        metrics.errors.inc(stage="openai")
+        model_router.record(route, 0.0, ok=False)
+        metrics.fallbacks.inc(kind="chat_error_response")
+        return CHAT_ERROR_RESPONSE
+
+async def _stream_chat_response(message: str, history: List[ChatMessage], products: List[ProductHit], use_answer_cache: bool = True) -> AsyncIterator[str]:
+    """Generate chat response using OpenAI, yielding tokens as they arrive"""
+    route = route_for(message, products)
+    cache_key = answer_cache_key(message, history, products, route) if use_answer_cache else None
+    if cache_key is not None:
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    
+    streamed_parts = []
+    try:
+        with metrics.stage_seconds.time(stage="prompt_build"):
+            messages = build_chat_messages(message, history, products)
+        
+        started = time.perf_counter()
+        stream = openai_admission.stream(lambda: get_openai_client().chat.completions.create(
+            model=route.deployment,
+            messages=messages,
+            max_tokens=route.max_tokens,
+            temperature=route.temperature,
+            stream=True
+        ))
+        
+        async for chunk in stream:
+            # Azure sends content filter results in chunks without choices
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                if not streamed_parts:
+                    metrics.stage_seconds.observe(time.perf_counter() - started, stage="openai.first_token")
+                streamed_parts.append(content)
+                yield content
+        
+        # Streams carry no usage block, so count with the prompt builder's tokenizer
+        latency = time.perf_counter() - started
+        metrics.stage_seconds.observe(latency, stage="openai")
+        metrics.stage_seconds.observe(latency, stage=f"openai.{route.name}")
+        prompt_tokens = prompt_builder.count_messages(messages)
+        completion_tokens = prompt_builder.counter.count("".join(streamed_parts))
+        metrics.tokens.observe(prompt_tokens, kind="prompt")
+        metrics.tokens.observe(completion_tokens, kind="completion")
+        model_router.record(route, latency, prompt_tokens, completion_tokens)
+        
+        if cache_key is not None and streamed_parts:
+            answer_cache.set(cache_key, "".join(streamed_parts).strip())
+                
+    except Exception as e:
+        logger.error(f"OpenAI streaming error: {str(e)}")
+        metrics.errors.inc(stage="openai")
+        model_router.record(route, 0.0, ok=False)
+        if not streamed_parts:
+            metrics.fallbacks.inc(kind="chat_error_response")
+            yield CHAT_ERROR_RESPONSE
+
+# Deep health checks are bounded and cached so probes cannot pile up on slow dependencies
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', '2'))
+HEALTH_CACHE_SECONDS = float(os.getenv('HEALTH_CACHE_SECONDS', '5'))
+_health_result: Dict[str, Any] = {}
+_health_checked_at = 0.0
+
+async def check_database() -> Dict[str, Any]:
+    if async_engine is None:
+        return {"status": "unavailable", "error": "async engine not configured"}
+    async with async_engine.connect() as conn:
+        await conn.execute(select(1))
+    pool = async_engine.sync_engine.pool
+    return {"status": "ok", "pool": pool.status() if hasattr(pool, 'status') else type(pool).__name__}
+
+async def check_search() -> Dict[str, Any]:
+    if search_clients.search_client is None:
+        return {"status": "unavailable", "error": "search client not configured"}
+    documents = await search_clients.search_client.get_document_count()
+    circuits = {guard.name: guard.breaker.state for guard in search_clients.guards.values()}
+    status = "ok" if all(state == 'closed' for state in circuits.values()) else "degraded"
+    return {"status": status, "documents": documents, "circuits": circuits}
+
+async def check_openai() -> Dict[str, Any]:
+    await get_openai_client().models.list()
+    return {"status": "ok", "admission": openai_admission.limiter.stats()}
+
+async def run_health_check(name: str, check) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(check(), timeout=HEALTH_CHECK_TIMEOUT)
+    except asyncio.TimeoutError:
+        result = {"status": "unavailable", "error": f"timed out after {HEALTH_CHECK_TIMEOUT}s"}
+    except Exception as e:
+        result = {"status": "unavailable", "error": f"{type(e).__name__}: {e}"}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/health/deep")
+async def deep_health_check():
+    """Check the database, search and OpenAI, not just the process"""
+    global _health_result, _health_checked_at
+    if time.monotonic() - _health_checked_at > HEALTH_CACHE_SECONDS:
+        names = ("database", "search", "openai")
+        results = await asyncio.gather(*(run_health_check(name, check) for name, check in zip(names, (check_database, check_search, check_openai))))
+        checks = dict(zip(names, results))
+        _health_result = {
+            "status": "healthy" if all(check["status"] == "ok" for check in checks.values()) else "degraded",
+            "timestamp": datetime.now().isoformat(),
+            "checks": checks,
+            "persistence_queue": persistence_queue.qsize()
+        }
+        _health_checked_at = time.monotonic()
+    return _health_result
+
+# Scrape-time metrics read from the counters the caches, limiters and guards already keep
+def _cache_stats() -> List[Dict[str, Any]]:
+    return [retrieval_cache.stats(), answer_cache.stats(), conversation_memory.stats(), search_clients.fallback_cache.stats()]
+
+metrics.register_callback('chatbot_cache_hits_total', 'Cache hits', ('cache',),
+                          lambda: [((stats['name'],), stats['hits']) for stats in _cache_stats()], 'counter')
+metrics.register_callback('chatbot_cache_misses_total', 'Cache misses', ('cache',),
+                          lambda: [((stats['name'],), stats['misses']) for stats in _cache_stats()], 'counter')
+metrics.register_callback('chatbot_cache_entries', 'Entries in each cache', ('cache',),
+                          lambda: [((stats['name'],), stats['size']) for stats in _cache_stats()])
+metrics.register_callback('chatbot_collapsed_calls_total', 'Calls served by an identical in-flight call', ('flight',),
+                          lambda: [((flight.name,), flight.collapsed) for flight in (search_flight, answer_flight)], 'counter')
+metrics.register_callback('chatbot_openai_concurrency_limit', 'Current adaptive OpenAI concurrency limit', (),
+                          lambda: [((), openai_admission.limiter.limit)])
+metrics.register_callback('chatbot_openai_in_flight', 'OpenAI calls holding a slot', (),
+                          lambda: [((), openai_admission.limiter.in_flight)])
+metrics.register_callback('chatbot_openai_queued', 'Requests waiting for an OpenAI slot', (),
+                          lambda: [((), openai_admission.limiter.stats()['queued'])])
+metrics.register_callback('chatbot_openai_rejected_total', 'Requests that timed out waiting for an OpenAI slot', (),
+                          lambda: [((), openai_admission.limiter.rejected)], 'counter')
+metrics.register_callback('chatbot_openai_retries_total', 'Retried OpenAI calls', (),
+                          lambda: [((), openai_admission.retries)], 'counter')
+metrics.register_callback('chatbot_search_circuit_open', 'Whether the circuit for a search index is not closed', ('index',),
+                          lambda: [((guard.name,), int(guard.breaker.state != 'closed')) for guard in search_clients.guards.values()])
+metrics.register_callback('chatbot_search_hedged_total', 'Hedged search requests', ('index',),
+                          lambda: [((guard.name,), guard.hedged) for guard in search_clients.guards.values()], 'counter')
+metrics.register_callback('chatbot_route_calls_total', 'OpenAI completions by model route', ('route', 'deployment'),
+                          lambda: model_router.counters('calls'), 'counter')
+metrics.register_callback('chatbot_route_errors_total', 'Failed OpenAI completions by model route', ('route', 'deployment'),
+                          lambda: model_router.counters('errors'), 'counter')
+metrics.register_callback('chatbot_route_cost_usd_total', 'Estimated OpenAI cost by model route', ('route', 'deployment'),
+                          lambda: model_router.counters('cost'), 'counter')
+metrics.register_callback('chatbot_persistence_queue_depth', 'Writes waiting for the background worker', (),
+                          lambda: [((), persistence_queue.qsize())])
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/admin/cache")
+async def get_cache_stats():
+    """Get retrieval, answer and conversation memory sizes and hit/miss counters"""
+    return {
+        "retrieval": retrieval_cache.stats(),
+        "answer": answer_cache.stats(),
+        "conversation": conversation_memory.stats()
+    }
+
+@app.get("/api/admin/admission")
+async def get_admission_stats():
+    """Get the OpenAI concurrency limit, queue and retry counters"""
+    return openai_admission.stats()
+
+@app.get("/api/admin/routing")
+async def get_routing_stats():
+    """Get the model route table with latency, tokens and estimated cost per route"""
+    return model_router.stats()
+
+@app.get("/api/admin/search")
+async def get_search_stats():
+    """Get circuit breaker state and hedging counters per search index"""
+    return {
+        "indexes": [guard.stats() for guard in search_clients.guards.values()],
+        "fallback_cache": search_clients.fallback_cache.stats(),
+        "policy_index": policy_index.index.stats() if policy_index.index is not None else None
+    }
+
+@app.get("/api/admin/coalescing")
+async def get_coalescing_stats():
+    """Get how many search and answer calls were collapsed into in-flight ones"""
+    return {
+        "search": search_flight.stats(),
+        "answer": answer_flight.stats()
+    }
+
+@app.post("/api/admin/cache/invalidate")
+async def invalidate_cache():
+    """Clear the retrieval and answer caches, e.g. after a search index refresh"""
+    removed = retrieval_cache.clear() + answer_cache.clear()
+    return {"status": "success", "removed": removed}
+
 @app.get("/chatbot.html")
 async def get_chatbot():
     """Serve chatbot HTML file"""
@@ -516,54 +938,88 @@ async def root():
         return {"error": f"File not found: {file_path}", "current_dir": os.getcwd(), "file_path": file_path, "parent_dir": parent_dir}
 
 # Database functions
+def apply_to_database(db: Session, session_id: str, data: dict, data_type: str):
+    """Add the rows for one message or feedback to a database session"""
+    # Queued writes carry the time they were made, not the time they are flushed
+    timestamp = data.get('timestamp_utc') or datetime.utcnow()
+    
+    if data_type == 'message':
+        # Save or update chat session
+        session = db.query(ChatSession).filter(ChatSession.session_id == session_id).with_for_update().first()
+        if not session:
+            turn_index = 0
+            session = ChatSession(
+                session_id=session_id,
+                created_at=timestamp,
+                last_updated=timestamp,
+                messages=[],
+                turn_count=2
+            )
+            db.add(session)
+            # Make the new session visible to later writes in the same batch
+            db.flush()
+        else:
+            turn_index = session.turn_count or 0
+            session.last_updated = timestamp
+            session.turn_count = turn_index + 2
+        
+        # Only this exchange is written, earlier turns are already stored
+        db.add_all([
+            ConversationTurn(session_id=session_id, turn_index=turn_index, role='user',
+                             content=data.get('user_message', ''), timestamp=timestamp),
+            ConversationTurn(session_id=session_id, turn_index=turn_index + 1, role='assistant',
+                             content=data.get('bot_response', ''), timestamp=timestamp)
+        ])
+        
+        # Save individual message
+        message = DBChatMessage(
+            session_id=session_id,
+            user_message=data.get('user_message', ''),
+            bot_response=data.get('bot_response', ''),
+            timestamp=timestamp,
+            message_id=str(uuid.uuid4())
+        )
+        db.add(message)
+        
+    elif data_type == 'feedback':
+        # Feedback points at the turns it was given on instead of copying them
+        turn_end = db.query(ChatSession.turn_count).filter(ChatSession.session_id == session_id).scalar() or 0
+        turn_start = max(0, turn_end - len(data.get('conversation_history') or []))
+        
+        # Save feedback
+        feedback = UserFeedback(
+            session_id=session_id,
+            rating=data.get('rating', ''),
+            feedback_text=data.get('feedback', ''),
+            timestamp=timestamp,
+            conversation_history=None,
+            turn_start=turn_start,
+            turn_end=turn_end,
+            feedback_id=str(uuid.uuid4())
+        )
+        db.add(feedback)
+
 def save_to_database(session_id: str, data: dict, data_type: str, db: Session = None):
     """Save data to PostgreSQL database"""
+    return save_batch_to_database([(session_id, data, data_type)], db)
+
+def save_batch_to_database(items: List[tuple], db: Session = None):
+    """Save a batch of (session_id, data, data_type) writes in one transaction"""
     try:
         if db is None:
             # Create a new session if none provided
-            from database import SessionLocal
+            from api.database import SessionLocal
             db = SessionLocal()
             close_db = True
         else:
             close_db = False
             
         try:
-            if data_type == 'message':
-                # Save or update chat session
-                session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
-                if not session:
-                    session = ChatSession(
-                        session_id=session_id,
-                        messages=[],
-                        conversation_history=data.get('conversation_history', [])
-                    )
-                    db.add(session)
-                else:
-                    session.last_updated = datetime.utcnow()
-                    session.conversation_history = data.get('conversation_history', [])
-                
-                # Save individual message
-                message = DBChatMessage(
-                    session_id=session_id,
-                    user_message=data.get('user_message', ''),
-                    bot_response=data.get('bot_response', ''),
-                    message_id=str(uuid.uuid4())
-                )
-                db.add(message)
-                
-            elif data_type == 'feedback':
-                # Save feedback
-                feedback = UserFeedback(
-                    session_id=session_id,
-                    rating=data.get('rating', ''),
-                    feedback_text=data.get('feedback', ''),
-                    conversation_history=data.get('conversation_history', []),
-                    feedback_id=str(uuid.uuid4())
-                )
-                db.add(feedback)
+            for session_id, data, data_type in items:
+                apply_to_database(db, session_id, data, data_type)
             
             db.commit()
-            logger.info(f"Data saved to database for session {session_id}")
+            logger.info(f"Data saved to database for {len(items)} writes")
             return True
             
         finally:
@@ -577,88 +1033,107 @@ def save_to_database(session_id: str, data: dict, data_type: str, db: Session =
         return False
 
 # Session-based JSON database functions (for backward compatibility)
-def save_to_session_db(session_id: str, data: dict, data_type: str):
-    """Save data to both database and JSON file for backward compatibility"""
+def save_batch_to_session_db(items: List[tuple]):
+    """Flush a batch of queued writes to the database and the session files"""
+    with metrics.stage_seconds.time(stage="db_write"):
+        saved = save_batch_to_database(items)
+        if not saved:
+            metrics.errors.inc(stage="db_write")
+        if not saved and len(items) > 1:
+            # Retry one by one so a single bad row does not lose the whole batch
+            for session_id, data, data_type in items:
+                save_to_database(session_id, data, data_type)
+    
     try:
-        # Try to save to database first
-        db_success = save_to_database(session_id, data, data_type)
-        
-        # Also save to JSON file for backward compatibility
-        # Create sessions directory if it doesn't exist
-        os.makedirs('sessions', exist_ok=True)
-        
-        file_path = os.path.join('sessions', f'session_{session_id}.json')
-        
-        # Load existing session data
-        session_data = {
-            "session_id": session_id,
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat(),
-            "messages": [],
-            "feedbacks": [],
-            "conversation_history": []
+        with metrics.stage_seconds.time(stage="session_log_write"):
+            session_store.append_batch([(session_id, session_record(data, data_type)) for session_id, data, data_type in items])
+    except Exception as e:
+        logger.error(f"Error saving to session log: {e}")
+        metrics.errors.inc(stage="session_log_write")
+
+def session_record(data: dict, data_type: str) -> dict:
+    """Build the session log record for a message or feedback"""
+    timestamp = (data.get('timestamp_utc') or datetime.utcnow()).isoformat()
+    
+    if data_type == 'message':
+        return {
+            "type": "message",
+            "timestamp": timestamp,
+            "user_message": data.get('user_message', ''),
+            "bot_response": data.get('bot_response', ''),
+            "id": str(uuid.uuid4())
         }
-        
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
-        
-        # Update last_updated timestamp
-        session_data['last_updated'] = datetime.now().isoformat()
-        
-        # Add data based on type
+    
+    return {
+        "type": "feedback",
+        "timestamp": timestamp,
+        "rating": data.get('rating', ''),
+        "feedback": data.get('feedback', ''),
+        "id": str(uuid.uuid4())
+    }
+
+def stream_session_file(session_id: str) -> Iterator[str]:
+    """Stream a file-backed session as JSON, one record at a time"""
+    def encode(value):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    
+    created_at = None
+    last_updated = None
+    conversation_history = []
+    # Feedback is interleaved with messages in the log; it is held back so the log is read once
+    feedbacks = []
+    
+    yield '{"session_id": ' + encode(session_id) + ', "messages": ['
+    separator = ''
+    for record in session_store.iter_records(session_id):
+        record_type = record.get('type')
+        if record_type == 'session':
+            created_at = record.get('created_at')
+            continue
+        if record.get('timestamp'):
+            created_at = created_at or record['timestamp']
+            last_updated = record['timestamp']
+        if record_type == 'message':
+            # Older records carry a copy of the history before their turn
+            if 'conversation_history' in record:
+                conversation_history = list(record['conversation_history'])
+            conversation_history.append({"role": "user", "content": record.get('user_message')})
+            conversation_history.append({"role": "assistant", "content": record.get('bot_response')})
+            yield separator + encode({key: record.get(key) for key in ('timestamp', 'user_message', 'bot_response', 'id')})
+            separator = ', '
+        elif record_type == 'history':
+            conversation_history = list(record['conversation_history'])
+        elif record_type == 'feedback':
+            feedbacks.append({key: record.get(key) for key in ('timestamp', 'rating', 'feedback', 'id')})
+    
+    yield '], "feedbacks": ' + encode(feedbacks)
+    yield ', "conversation_history": ' + encode(conversation_history)
+    yield ', "created_at": ' + encode(created_at) + ', "last_updated": ' + encode(last_updated) + '}'
+
+def release_conversation_writes(batch: List[tuple]):
+    """Unpin the conversation memory of sessions whose queued turns were handled"""
+    for session_id, _, data_type in batch:
         if data_type == 'message':
-            session_data['messages'].append({
-                "timestamp": datetime.now().isoformat(),
-                "user_message": data.get('user_message', ''),
-                "bot_response": data.get('bot_response', ''),
-                "id": str(uuid.uuid4())
-            })
-            # Update conversation history
-            if 'conversation_history' in data:
-                session_data['conversation_history'] = data['conversation_history']
-        elif data_type == 'feedback':
-            session_data['feedbacks'].append({
-                "timestamp": datetime.now().isoformat(),
-                "rating": data.get('rating', ''),
-                "feedback": data.get('feedback', ''),
-                "id": str(uuid.uuid4())
-            })
-        
-        # Save back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, ensure_ascii=False, indent=2)
-            
-        logger.info(f"Session data saved to {file_path}")
-        return db_success or True  # Return success if either database or file save worked
-    except Exception as e:
-        logger.error(f"Error saving to session DB: {e}")
-        return False
+            conversation_memory.written(session_id)
+
+# Turns and feedback are written behind the response by a background worker
+persistence_queue = WriteBehindQueue(save_batch_to_session_db, on_flushed=release_conversation_writes)
 
 # Legacy function for backward compatibility
+# Append-only stores behind the legacy data/feedback.json and data/chat_history.json
+json_stores = {
+    'feedback.json': SegmentedRecordStore('data', 'feedback'),
+    'chat_history.json': SegmentedRecordStore('data', 'chat_history')
+}
+
 def save_to_json_db(filename: str, data: dict):
     """Save data to JSON file database (legacy)"""
     try:
-        # Create data directory if it doesn't exist
-        os.makedirs('data', exist_ok=True)
-        
-        file_path = os.path.join('data', filename)
-        
-        # Load existing data
-        existing_data = []
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-        
         # Add new data with unique ID
         data['id'] = str(uuid.uuid4())
-        existing_data.append(data)
-        
-        # Save back to file
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+        json_stores[filename].append(data)
             
-        logger.info(f"Data saved to {file_path}")
+        logger.info(f"Data saved to {filename} store")
         return True
     except Exception as e:
         logger.error(f"Error saving to JSON DB: {e}")
@@ -675,17 +1150,14 @@ async def save_feedback(request: FeedbackRequest):
             "conversation_history": request.conversationHistory
         }
         
-        # Save to session-based database
-        success = save_to_session_db(request.session_id, feedback_data, 'feedback')
+        # Queue for the session-based database
+        await persistence_queue.put((request.session_id, dict(feedback_data, timestamp_utc=datetime.utcnow()), 'feedback'))
         
         # Also save to legacy database for backward compatibility
         feedback_data["created_at"] = datetime.now().isoformat()
-        save_to_json_db('feedback.json', feedback_data)
+        await asyncio.to_thread(save_to_json_db, 'feedback.json', feedback_data)
         
-        if success:
-            return {"status": "success", "message": "Feedback saved successfully"}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save feedback")
+        return {"status": "success", "message": "Feedback saved successfully"}
             
     except Exception as e:
         logger.error(f"Error saving feedback: {e}")
@@ -702,7 +1174,7 @@ async def save_chat_history(request: ChatHistoryRequest):
             "created_at": datetime.now().isoformat()
         }
         
-        success = save_to_json_db('chat_history.json', chat_data)
+        success = await asyncio.to_thread(save_to_json_db, 'chat_history.json', chat_data)
         
         if success:
             return {"status": "success", "message": "Chat history saved successfully"}
@@ -713,83 +1185,236 @@ async def save_chat_history(request: ChatHistoryRequest):
         logger.error(f"Error saving chat history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/feedback")
-async def get_feedback(db: Session = Depends(get_db)):
-    """Get all feedback data from database"""
+def encode_cursor(*values) -> str:
+    """Encode a keyset position as an opaque cursor"""
+    payload = json.dumps(list(values), default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, *types) -> list:
+    """Decode a cursor made by encode_cursor, converting each value to its type"""
     try:
-        # Get feedback from database
-        db_feedbacks = db.query(UserFeedback).order_by(UserFeedback.timestamp.desc()).all()
-        feedback_list = []
-        
-        for fb in db_feedbacks:
-            feedback_list.append({
-                "id": fb.feedback_id,
-                "session_id": fb.session_id,
-                "rating": fb.rating,
-                "feedback": fb.feedback_text,
-                "timestamp": fb.timestamp.isoformat(),
-                "conversation_history": fb.conversation_history,
-                "created_at": fb.timestamp.isoformat()
-            })
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if len(values) != len(types):
+            raise ValueError("cursor length")
+        return [
+            None if value is None else datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value_type, value in zip(types, values)
+        ]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def feedback_row(fb: UserFeedback) -> Dict[str, Any]:
+    """Feedback row in the /api/feedback output format"""
+    return {
+        "id": fb.feedback_id,
+        "session_id": fb.session_id,
+        "rating": fb.rating,
+        "feedback": fb.feedback_text,
+        "timestamp": fb.timestamp.isoformat(),
+        "conversation_history": fb.conversation_history or [],
+        "turn_start": fb.turn_start,
+        "turn_end": fb.turn_end,
+        "created_at": fb.timestamp.isoformat()
+    }
+
+def chat_message_row(msg: DBChatMessage) -> Dict[str, Any]:
+    """Chat message row in the /api/chat-history output format"""
+    return {
+        "id": msg.message_id,
+        "session_id": msg.session_id,
+        "user_message": msg.user_message,
+        "bot_response": msg.bot_response,
+        "timestamp": msg.timestamp.isoformat(),
+        "created_at": msg.timestamp.isoformat()
+    }
+
+# Columns for CSV exports
+FEEDBACK_EXPORT_FIELDS = ["id", "session_id", "rating", "feedback", "timestamp", "created_at", "turn_start", "turn_end", "conversation_history", "source"]
+CHAT_HISTORY_EXPORT_FIELDS = ["id", "session_id", "user_message", "bot_response", "timestamp", "created_at", "source"]
+
+# Rows per server-side batch when exporting
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """A query bound as naive UTC like the stored timestamps, naive input is taken as UTC"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def history_filters(model, session_id: Optional[str], since: Optional[datetime], until: Optional[datetime], rating: Optional[str] = None) -> list:
+    """SQL filters for the chat history and feedback listings"""
+    filters = []
+    if session_id:
+        filters.append(model.session_id == session_id)
+    if since:
+        filters.append(model.timestamp >= since)
+    if until:
+        filters.append(model.timestamp < until)
+    if rating:
+        filters.append(model.rating == rating)
+    return filters
+
+def iter_store_records(store: SegmentedRecordStore, offset: int, session_id: Optional[str], since: Optional[datetime],
+                       until: Optional[datetime], rating: Optional[str] = None) -> Iterator[tuple]:
+    """Yield (position, record) from a legacy JSON store that match the filters"""
+    # Legacy records have no session id
+    if session_id:
+        return
+    since_key = since.isoformat() if since else None
+    until_key = until.isoformat() if until else None
+    for position, record in enumerate(store.iter_records(offset=offset, since=since_key), offset):
+        if until_key and (record.get('created_at') or '') >= until_key:
+            continue
+        if rating and record.get('rating') != rating:
+            continue
+        yield position, dict(record, source='json_file')
+
+async def paginate_history(db: AsyncSession, model, row_to_dict, filters: list, store_records, limit: int, cursor: Optional[str]) -> tuple:
+    """One page of database rows, newest first, followed by legacy JSON store records
+
+    The cursor is ("db", timestamp, primary key) while paging the database
+    and ("file", None, offset) once it moves on to the JSON store.
+    """
+    source, after_timestamp, after_position = decode_cursor(cursor, str, datetime, int) if cursor else ("db", None, None)
+    if source not in ("db", "file"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    items = []
+    if source == "db":
+        query = select(model).where(*filters)
+        # Keyset pagination on (timestamp, id)
+        if after_timestamp is not None:
+            query = query.where(or_(
+                model.timestamp < after_timestamp,
+                and_(model.timestamp == after_timestamp, model.id < after_position)
+            ))
+        rows = (await db.execute(query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1))).scalars().all()
         
-        # Also include JSON file feedback for backward compatibility
-        file_path = os.path.join('data', 'feedback.json')
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-            # Add source indicator for JSON data
-            for item in json_data:
-                item['source'] = 'json_file'
-            feedback_list.extend(json_data)
-        
-        return {"feedback": feedback_list}
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            return [row_to_dict(row) for row in rows[:limit]], encode_cursor("db", last.timestamp, last.id)
+        items = [row_to_dict(row) for row in rows]
+        after_position = 0
+    
+    # Also include JSON file records for backward compatibility once the database is exhausted
+    needed = limit - len(items)
+    records = await asyncio.to_thread(lambda: list(itertools.islice(store_records(after_position), needed + 1)))
+    for position, record in records:
+        if len(items) == limit:
+            return items, encode_cursor("file", None, position)
+        items.append(record)
+    
+    return items, None
+
+def export_history(model, row_to_dict, filters: list, store_records, fields: List[str], export_format: str) -> StreamingResponse:
+    """Stream every matching row as NDJSON or CSV, reading the database in batches"""
+    def rows():
+        # The request's session is closed once the response starts, so use our own
+        from api.database import SessionLocal
+        db = SessionLocal()
+        try:
+            query = db.query(model).filter(*filters).order_by(model.timestamp.desc(), model.id.desc())
+            for row in query.yield_per(EXPORT_BATCH_SIZE):
+                yield row_to_dict(row)
+        finally:
+            db.close()
+        for _, record in store_records(0):
+            yield record
+    
+    if export_format == 'csv':
+        def body():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows():
+                if isinstance(row.get('conversation_history'), list):
+                    row = dict(row, conversation_history=json.dumps(row['conversation_history'], ensure_ascii=False))
+                writer.writerow(row)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        return StreamingResponse(body(), media_type="text/csv; charset=utf-8")
+    
+    def ndjson_body():
+        for row in rows():
+            yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+    return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
+
+@app.get("/api/feedback")
+async def get_feedback(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    rating: Optional[str] = None,
+    format: str = Query('json', pattern='^(json|ndjson|csv)$'),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get feedback data from database, a page at a time or as a streamed export"""
+    since, until = utc_naive(since), utc_naive(until)
+    filters = history_filters(UserFeedback, session_id, since, until, rating)
+    store_records = lambda offset: iter_store_records(json_stores['feedback.json'], offset, session_id, since, until, rating)
+    
+    if format != 'json':
+        return export_history(UserFeedback, feedback_row, filters, store_records, FEEDBACK_EXPORT_FIELDS, format)
+    
+    try:
+        feedback_list, next_cursor = await paginate_history(db, UserFeedback, feedback_row, filters, store_records, limit, cursor)
+        return {"feedback": feedback_list, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error reading feedback: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/chat-history")
-async def get_chat_history(db: Session = Depends(get_db)):
-    """Get all chat history data from database"""
+async def get_chat_history(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query('json', pattern='^(json|ndjson|csv)$'),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get chat history data from database, a page at a time or as a streamed export"""
+    since, until = utc_naive(since), utc_naive(until)
+    filters = history_filters(DBChatMessage, session_id, since, until)
+    store_records = lambda offset: iter_store_records(json_stores['chat_history.json'], offset, session_id, since, until)
+    
+    if format != 'json':
+        return export_history(DBChatMessage, chat_message_row, filters, store_records, CHAT_HISTORY_EXPORT_FIELDS, format)
+    
     try:
-        # Get messages from database
-        db_messages = db.query(ChatMessage).order_by(ChatMessage.timestamp.desc()).all()
-        chat_history = []
-        
-        for msg in db_messages:
-            chat_history.append({
-                "id": msg.message_id,
-                "session_id": msg.session_id,
-                "user_message": msg.user_message,
-                "bot_response": msg.bot_response,
-                "timestamp": msg.timestamp.isoformat(),
-                "created_at": msg.timestamp.isoformat()
-            })
-        
-        # Also include JSON file chat history for backward compatibility
-        file_path = os.path.join('data', 'chat_history.json')
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-            # Add source indicator for JSON data
-            for item in json_data:
-                item['source'] = 'json_file'
-            chat_history.extend(json_data)
-        
-        return {"chat_history": chat_history}
+        chat_history, next_cursor = await paginate_history(db, DBChatMessage, chat_message_row, filters, store_records, limit, cursor)
+        return {"chat_history": chat_history, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error reading chat history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/session/{session_id}")
-async def get_session_data(session_id: str, db: Session = Depends(get_db)):
+async def get_session_data(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get session-specific data from database"""
     try:
         # Try to get from database first
-        session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
-        messages = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.timestamp).all()
-        feedbacks = db.query(UserFeedback).filter(UserFeedback.session_id == session_id).order_by(UserFeedback.timestamp).all()
+        session = await db.scalar(select(ChatSession).where(ChatSession.session_id == session_id))
         
         if session:
+            messages = (await db.execute(
+                select(DBChatMessage).where(DBChatMessage.session_id == session_id).order_by(DBChatMessage.timestamp)
+            )).scalars().all()
+            feedbacks = (await db.execute(
+                select(UserFeedback).where(UserFeedback.session_id == session_id).order_by(UserFeedback.timestamp)
+            )).scalars().all()
+            turns = (await db.execute(
+                select(ConversationTurn.role, ConversationTurn.content)
+                .where(ConversationTurn.session_id == session_id)
+                .order_by(ConversationTurn.turn_index)
+            )).all()
             return {
                 "session_id": session.session_id,
                 "created_at": session.created_at.isoformat(),
@@ -804,69 +1429,146 @@ async def get_session_data(session_id: str, db: Session = Depends(get_db)):
                     "id": fb.feedback_id,
                     "timestamp": fb.timestamp.isoformat(),
                     "rating": fb.rating,
-                    "feedback": fb.feedback_text
+                    "feedback": fb.feedback_text,
+                    "turn_start": fb.turn_start,
+                    "turn_end": fb.turn_end
                 } for fb in feedbacks],
-                "conversation_history": session.conversation_history
+                "conversation_history": [{"role": turn.role, "content": turn.content} for turn in turns]
             }
         
-        # Fallback to JSON file if not found in database
-        file_path = os.path.join('sessions', f'session_{session_id}.json')
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return data
+        # Fallback to the session log if not found in database
+        if await asyncio.to_thread(session_store.exists, session_id):
+            return StreamingResponse(stream_session_file(session_id), media_type="application/json")
         else:
             return {"error": "Session not found"}
     except Exception as e:
         logger.error(f"Error reading session data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Sort fields allowed for /api/sessions
+SESSION_SORT_COLUMNS = {
+    'created_at': ChatSession.created_at,
+    'last_updated': ChatSession.last_updated
+}
+
+def parse_timestamp(value: Optional[str]) -> datetime:
+    """Parse an ISO timestamp from a session file, oldest possible if missing"""
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return datetime.min
+
+# Legacy file sessions missing from the database, as (sort keys, summaries) per sort field, built once
+_file_session_index: Dict[str, Tuple[List[tuple], List[Dict[str, Any]]]] = {}
+_file_session_index_lock = asyncio.Lock()
+
+async def file_session_index(db: AsyncSession) -> Dict[str, Tuple[List[tuple], List[Dict[str, Any]]]]:
+    """Legacy file-backed sessions missing from the database, sorted by each sort field"""
+    async with _file_session_index_lock:
+        if not _file_session_index:
+            summaries = await asyncio.to_thread(session_store.legacy_summaries)
+            in_db = set()
+            session_ids = list(summaries)
+            for start in range(0, len(session_ids), 500):
+                chunk = session_ids[start:start + 500]
+                in_db.update(await db.scalars(select(ChatSession.session_id).where(ChatSession.session_id.in_(chunk))))
+            sessions = [
+                dict(session_id=session_id, source="json_file", **summary)
+                for session_id, summary in summaries.items()
+                if session_id not in in_db
+            ]
+            for sort in SESSION_SORT_COLUMNS:
+                ordered = sorted(((parse_timestamp(session[sort]), session["session_id"]), session) for session in sessions)
+                _file_session_index[sort] = ([key for key, _ in ordered], [session for _, session in ordered])
+    return _file_session_index
+
+async def file_only_sessions(db: AsyncSession, sort: str, after: Optional[tuple], descending: bool, count: int) -> List[Dict[str, Any]]:
+    """Up to count file-backed sessions past the cursor, in page order"""
+    keys, sessions = (await file_session_index(db))[sort]
+    page = []
+    while len(page) < count:
+        needed = count - len(page)
+        if descending:
+            end = bisect.bisect_left(keys, after) if after is not None else len(keys)
+            batch = sessions[max(0, end - needed):end][::-1]
+        else:
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            batch = sessions[start:start + needed]
+        if not batch:
+            break
+        
+        # A legacy session that has since been continued is listed from the database
+        in_db = set(await db.scalars(select(ChatSession.session_id).where(ChatSession.session_id.in_([session["session_id"] for session in batch]))))
+        page.extend(session for session in batch if session["session_id"] not in in_db)
+        after = (parse_timestamp(batch[-1][sort]), batch[-1]["session_id"])
+    return page
+
 @app.get("/api/sessions")
-async def get_all_sessions(db: Session = Depends(get_db)):
-    """Get list of all sessions from database"""
+async def get_all_sessions(
+    limit: int = Query(100, ge=1, le=1000),
+    sort: str = Query('last_updated', pattern='^(created_at|last_updated)$'),
+    order: str = Query('desc', pattern='^(asc|desc)$'),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a page of sessions with message and feedback counts"""
+    after = tuple(decode_cursor(cursor, datetime, str)) if cursor else None
+    descending = order == 'desc'
+    
     try:
-        # Get sessions from database
-        db_sessions = db.query(ChatSession).all()
-        sessions = []
+        sort_column = SESSION_SORT_COLUMNS[sort]
         
-        for session in db_sessions:
-            message_count = db.query(ChatMessage).filter(ChatMessage.session_id == session.session_id).count()
-            feedback_count = db.query(UserFeedback).filter(UserFeedback.session_id == session.session_id).count()
-            
+        # Counts are correlated subqueries, so only the sessions on the page are counted
+        message_count = select(func.count(DBChatMessage.id)).where(
+            DBChatMessage.session_id == ChatSession.session_id
+        ).correlate(ChatSession).scalar_subquery()
+        feedback_count = select(func.count(UserFeedback.id)).where(
+            UserFeedback.session_id == ChatSession.session_id
+        ).correlate(ChatSession).scalar_subquery()
+        
+        query = select(
+            ChatSession.session_id,
+            ChatSession.created_at,
+            ChatSession.last_updated,
+            message_count.label('message_count'),
+            feedback_count.label('feedback_count')
+        )
+        
+        # Keyset pagination on (sort column, session_id)
+        if after is not None:
+            sort_value, session_id = after
+            if descending:
+                query = query.where(or_(sort_column < sort_value, and_(sort_column == sort_value, ChatSession.session_id < session_id)))
+            else:
+                query = query.where(or_(sort_column > sort_value, and_(sort_column == sort_value, ChatSession.session_id > session_id)))
+        
+        if descending:
+            query = query.order_by(sort_column.desc(), ChatSession.session_id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), ChatSession.session_id.asc())
+        
+        sessions = []
+        for row in await db.execute(query.limit(limit + 1)):
             sessions.append({
-                "session_id": session.session_id,
-                "created_at": session.created_at.isoformat(),
-                "last_updated": session.last_updated.isoformat(),
-                "message_count": message_count,
-                "feedback_count": feedback_count
+                "session_id": row.session_id,
+                "created_at": row.created_at.isoformat(),
+                "last_updated": row.last_updated.isoformat(),
+                "message_count": row.message_count,
+                "feedback_count": row.feedback_count
             })
         
-        # Also include JSON file sessions for backward compatibility
-        sessions_dir = 'sessions'
-        if os.path.exists(sessions_dir):
-            existing_session_ids = {s["session_id"] for s in sessions}
-            
-            for filename in os.listdir(sessions_dir):
-                if filename.startswith('session_') and filename.endswith('.json'):
-                    session_id = filename.replace('session_', '').replace('.json', '')
-                    
-                    # Skip if already in database
-                    if session_id in existing_session_ids:
-                        continue
-                        
-                    file_path = os.path.join(sessions_dir, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        session_data = json.load(f)
-                    sessions.append({
-                        "session_id": session_id,
-                        "created_at": session_data.get('created_at'),
-                        "last_updated": session_data.get('last_updated'),
-                        "message_count": len(session_data.get('messages', [])),
-                        "feedback_count": len(session_data.get('feedbacks', [])),
-                        "source": "json_file"
-                    })
-        
-        return {"sessions": sessions}
+        # Also include file-backed sessions for backward compatibility, in the same order
+        sessions.extend(await file_only_sessions(db, sort, after, descending, limit + 1))
+        
+        sessions.sort(key=lambda s: (parse_timestamp(s[sort]), s["session_id"]), reverse=descending)
+        
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            last = sessions[-1]
+            next_cursor = encode_cursor(parse_timestamp(last[sort]), last["session_id"])
+        
+        return {"sessions": sessions, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Error reading sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,174 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Tuple
+import bisect
+import math
+import threading
+import time
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits up to slow completions
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+# Token count buckets for prompts and completions
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 3000, 4000, 8000)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric(ABC):
+    type_name = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.type_name}']
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines for the metric, header included"""
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+class Histogram(_Metric):
+    """Bucketed observations per label set"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe how long the block takes, unless it raises"""
+        started = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - started, **labels)
+
+    async def timed(self, awaitable: Awaitable[Any], **labels) -> Any:
+        """Await and observe how long it took, unless it raises or is cancelled"""
+        started = time.perf_counter()
+        result = await awaitable
+        self.observe(time.perf_counter() - started, **labels)
+        return result
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+class CallbackMetric(_Metric):
+    """Gauge or counter read at scrape time from a callback returning (labels, value) pairs"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+                 type_name: str = 'gauge'):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+        self.type_name = type_name
+
+    def render(self) -> List[str]:
+        try:
+            values = list(self.collect())
+        except Exception as e:
+            logger.warning(f"Error collecting metric {self.name}: {e}")
+            return []
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+class Registry:
+    """Metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+# Application metrics
+stage_seconds = registry.register(Histogram(
+    'chatbot_stage_seconds', 'Latency of each request stage', ('stage',)
+))
+request_seconds = registry.register(Histogram(
+    'chatbot_request_seconds', 'End to end latency of chat requests', ('endpoint',)
+))
+tokens = registry.register(Histogram(
+    'chatbot_tokens', 'Prompt and completion tokens per OpenAI call', ('kind',), buckets=TOKEN_BUCKETS
+))
+fallbacks = registry.register(Counter(
+    'chatbot_fallbacks_total', 'Requests served by a fallback path', ('kind',)
+))
+errors = registry.register(Counter(
+    'chatbot_errors_total', 'Errors by stage', ('stage',)
+))
+
+def register_callback(name: str, help_text: str, labelnames: Tuple[str, ...],
+                      collect: Callable[[], Iterable[Tuple[LabelValues, float]]], type_name: str = 'gauge') -> CallbackMetric:
+    """Register a metric whose values are read from existing counters at scrape time"""
+    return registry.register(CallbackMetric(name, help_text, labelnames, collect, type_name))
@@ -0,0 +1,153 @@
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Deque, Dict, List, Optional
+import json
+import threading
+import os
+from dotenv import load_dotenv
+import logging
+from api.query_classifier import QueryIntents
+from api.retrieval import ProductHit
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Deployments; the small one falls back to the large one until it is configured
+OPENAI_DEPLOYMENT_LARGE = os.getenv('OPENAI_DEPLOYMENT_LARGE', 'gpt-4')
+OPENAI_DEPLOYMENT_SMALL = os.getenv('OPENAI_DEPLOYMENT_SMALL', OPENAI_DEPLOYMENT_LARGE)
+
+# Route overrides as JSON, e.g. {"comparison": {"max_tokens": 1000}}
+MODEL_ROUTES = os.getenv('MODEL_ROUTES', '')
+# USD per 1K (prompt, completion) tokens by deployment, for the cost report
+MODEL_PRICES = os.getenv('MODEL_PRICES', '')
+DEFAULT_PRICES = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-35-turbo': (0.0005, 0.0015)
+}
+
+@dataclass(frozen=True)
+class Route:
+    """Completion settings for one kind of request"""
+    name: str
+    deployment: str
+    max_tokens: int
+    temperature: float
+
+# Short, grounded answers go to the small deployment; comparisons need the large one
+DEFAULT_ROUTES = {
+    'policy': Route('policy', OPENAI_DEPLOYMENT_SMALL, 400, 0.2),
+    'single_product': Route('single_product', OPENAI_DEPLOYMENT_SMALL, 500, 0.5),
+    'comparison': Route('comparison', OPENAI_DEPLOYMENT_LARGE, 800, 0.7),
+    'small_talk': Route('small_talk', OPENAI_DEPLOYMENT_SMALL, 200, 0.7)
+}
+
+def load_routes(overrides: str = MODEL_ROUTES) -> Dict[str, Route]:
+    """Default routes with the JSON overrides applied, ignoring a broken override"""
+    routes = dict(DEFAULT_ROUTES)
+    if not overrides:
+        return routes
+    try:
+        for name, settings in json.loads(overrides).items():
+            if name not in routes:
+                logger.warning(f"Ignoring unknown model route {name}")
+                continue
+            routes[name] = Route(**{**asdict(routes[name]), **settings, 'name': name})
+    except (ValueError, TypeError) as e:
+        logger.error(f"Invalid MODEL_ROUTES, using the default routes: {e}")
+        return dict(DEFAULT_ROUTES)
+    return routes
+
+def load_prices(overrides: str = MODEL_PRICES) -> Dict[str, tuple]:
+    """Per-deployment prices with the JSON overrides applied"""
+    prices = dict(DEFAULT_PRICES)
+    if overrides:
+        try:
+            prices.update({deployment: tuple(price) for deployment, price in json.loads(overrides).items()})
+        except (ValueError, TypeError) as e:
+            logger.error(f"Invalid MODEL_PRICES, using the default prices: {e}")
+    return prices
+
+class _RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latencies: Deque[float] = deque(maxlen=500)
+
+class ModelRouter:
+    """Picks deployment, max_tokens and temperature by intent and tracks latency and cost per route"""
+
+    def __init__(self, routes: Optional[Dict[str, Route]] = None, prices: Optional[Dict[str, tuple]] = None):
+        self.routes = routes or load_routes()
+        self.prices = prices or load_prices()
+        self._stats = {name: _RouteStats() for name in self.routes}
+        self._lock = threading.Lock()
+
+    def route(self, intents: QueryIntents, products: List[ProductHit]) -> Route:
+        """The route for a message's intents and the context retrieved for it"""
+        # Retrieval falls back to broad matches for a greeting, so decide on the intents alone
+        if intents.is_small_talk and not (intents.is_policy or intents.is_comparison or intents.product_ids or intents.colors):
+            return self.routes['small_talk']
+        if any(product.type == 'policy' for product in products):
+            return self.routes['policy']
+        if intents.is_comparison:
+            return self.routes['comparison']
+        if products:
+            return self.routes['single_product']
+        return self.routes['small_talk']
+
+    def cost(self, deployment: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.prices.get(deployment, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record(self, route: Route, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, ok: bool = True):
+        """Record one completion on a route"""
+        with self._lock:
+            stats = self._stats[route.name]
+            stats.calls += 1
+            if not ok:
+                stats.errors += 1
+                return
+            stats.latencies.append(latency)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost += self.cost(route.deployment, prompt_tokens, completion_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-route settings, latency, tokens and cost, with what the large deployment would have cost"""
+        report = {}
+        total_cost = large_cost = 0.0
+        with self._lock:
+            for name, route in self.routes.items():
+                stats = self._stats[name]
+                ordered = sorted(stats.latencies)
+                ok_calls = stats.calls - stats.errors
+                report[name] = dict(
+                    asdict(route),
+                    calls=stats.calls,
+                    errors=stats.errors,
+                    p50_ms=round(ordered[len(ordered) // 2] * 1000, 1) if ordered else None,
+                    p95_ms=round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else None,
+                    avg_prompt_tokens=round(stats.prompt_tokens / ok_calls, 1) if ok_calls else 0.0,
+                    avg_completion_tokens=round(stats.completion_tokens / ok_calls, 1) if ok_calls else 0.0,
+                    cost_usd=round(stats.cost, 4)
+                )
+                total_cost += stats.cost
+                large_cost += self.cost(OPENAI_DEPLOYMENT_LARGE, stats.prompt_tokens, stats.completion_tokens)
+        return {
+            "routes": report,
+            "cost_usd": round(total_cost, 4),
+            "cost_usd_all_large": round(large_cost, 4)
+        }
+
+    def counters(self, field: str) -> List[tuple]:
+        """(route, deployment) labelled values of one counter, for the metrics endpoint"""
+        with self._lock:
+            return [((name, route.deployment), getattr(self._stats[name], field)) for name, route in self.routes.items()]
@@ -0,0 +1,110 @@
+from typing import Any, Callable, List, Optional
+import asyncio
+import os
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Write-behind settings
+PERSIST_QUEUE_SIZE = int(os.getenv('PERSIST_QUEUE_SIZE', '1000'))
+PERSIST_BATCH_SIZE = int(os.getenv('PERSIST_BATCH_SIZE', '50'))
+PERSIST_FLUSH_INTERVAL = float(os.getenv('PERSIST_FLUSH_INTERVAL', '0.5'))
+
+class WriteBehindQueue:
+    """Bounded queue flushed in batches by a background worker task
+
+    flush_batch is a blocking function and runs in a worker thread so the
+    event loop is never held up by the database. on_flushed, if given, is
+    called on the event loop with each batch once it has been handled.
+    """
+
+    def __init__(
+        self,
+        flush_batch: Callable[[List[Any]], None],
+        max_size: int = PERSIST_QUEUE_SIZE,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        flush_interval: float = PERSIST_FLUSH_INTERVAL,
+        on_flushed: Optional[Callable[[List[Any]], None]] = None
+    ):
+        self.flush_batch = flush_batch
+        self.on_flushed = on_flushed
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the flush worker on the running event loop"""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._worker = asyncio.create_task(self._run())
+
+    async def put(self, item: Any):
+        """Queue an item, waiting for space when the queue is full"""
+        if self._queue is None:
+            # Not started (e.g. scripts or tests), write straight through
+            await self._write([item])
+            return
+        if self._queue.full():
+            logger.warning("Write-behind queue full, applying backpressure")
+        await self._queue.put(item)
+
+    def qsize(self) -> int:
+        """Number of items waiting to be flushed"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _next_batch(self) -> List[Any]:
+        batch = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Any]):
+        await asyncio.to_thread(self._flush, batch)
+        if self.on_flushed is not None:
+            self.on_flushed(batch)
+
+    def _flush(self, batch: List[Any]):
+        try:
+            self.flush_batch(batch)
+            self.flushed += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Error flushing {len(batch)} queued writes: {e}")
+
+    async def _run(self):
+        # Runs until stop() is requested and everything queued is flushed
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def stop(self):
+        """Stop the worker after flushing everything still queued"""
+        if self._worker is None:
+            return
+
+        pending = self._queue.qsize()
+        self._stopping = True
+        await self._worker
+        self._worker = None
+        self._queue = None
+        self._stopping = False
+        logger.info(f"Write-behind queue drained ({pending} items pending at shutdown)")
@@ -0,0 +1,175 @@
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import re
+import time
+import os
+from dotenv import load_dotenv
+import logging
+import numpy as np
+from api import search_clients
+from api.search_clients import run_search
+from api.text_utils import turkish_casefold
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Policy index settings
+POLICY_INDEX_REFRESH_SECONDS = float(os.getenv('POLICY_INDEX_REFRESH_SECONDS', '1800'))
+POLICY_PAGE_SIZE = 1000  # Azure Search maximum for top
+POLICY_SELECT_FIELDS = ['id', 'chunk']
+BM25_K1 = float(os.getenv('POLICY_BM25_K1', '1.2'))
+BM25_B = float(os.getenv('POLICY_BM25_B', '0.75'))
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Function words that say nothing about which policy is meant
+STOPWORDS = frozenset("""
+acaba ama ancak bana beni benim bir biz bu bunu şu da de daha diye en gibi hangi her için ile ise
+kadar ki mi mı mu mü misiniz mısınız musunuz ne neden nasıl nedir o olarak olan sen siz size sizin
+ve veya ya yani çok var mı yok
+""".split())
+
+# Inflectional suffixes, longest first; harmony variants are listed separately
+SUFFIXES = tuple(sorted("""
+lar ler ları leri ların lerin lara lere larda lerde lardan lerden
+nın nin nun nün ın in un ün
+ndan nden dan den tan ten
+nda nde da de ta te
+ndaki ndeki daki deki
+na ne ya ye yı yi yu yü
+sı si su sü
+la le yla yle ıyla iyle
+ım im um üm
+ı i u ü a e
+""".split(), key=len, reverse=True))
+MIN_STEM_LENGTH = 3
+
+def stem(token: str) -> str:
+    """Strip inflectional suffixes so inflected forms share a stem (iade, iadesi, iadeler)"""
+    for _ in range(3):
+        for suffix in SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                token = token[:-len(suffix)]
+                break
+        else:
+            break
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Casefold with Turkish rules, split into words, drop stopwords and stem"""
+    return [stem(word) for word in WORD_PATTERN.findall(turkish_casefold(text)) if word not in STOPWORDS and not word.isdigit()]
+
+class PolicyIndex:
+    """In-memory BM25 index over the policy chunks
+
+    Term weights are computed once per chunk, so a query is scored against
+    every chunk at once by summing the weight rows of its terms.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], k1: float = BM25_K1, b: float = BM25_B):
+        self.loaded_at = time.time()
+        self.documents = [{'id': document.get('id', ''), 'chunk': document.get('chunk', '')} for document in documents if document.get('chunk')]
+        tokenized = [tokenize(document['chunk']) for document in self.documents]
+
+        self.terms: Dict[str, int] = {}
+        for tokens in tokenized:
+            for token in tokens:
+                self.terms.setdefault(token, len(self.terms))
+
+        # Term frequencies as a terms x chunks matrix
+        counts = np.zeros((len(self.terms), len(self.documents)), dtype=np.float32)
+        for column, tokens in enumerate(tokenized):
+            for token in tokens:
+                counts[self.terms[token], column] += 1
+
+        lengths = counts.sum(axis=0)
+        average_length = float(lengths.mean()) if len(self.documents) else 0.0
+        document_frequency = (counts > 0).sum(axis=1)
+        idf = np.log1p((len(self.documents) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / average_length) if average_length else np.ones_like(lengths)
+        self._weights = idf[:, None] * counts * (k1 + 1) / (counts + norm[None, :])
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, top: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """Best matching chunks with their BM25 scores, chunks matching no term are left out"""
+        term_ids = [self.terms[token] for token in tokenize(query) if token in self.terms]
+        if not term_ids or not self.documents:
+            return []
+        scores = self._weights[term_ids].sum(axis=0)
+        top = min(top, int(np.count_nonzero(scores)))
+        if top <= 0:
+            return []
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(float(scores[i]), self.documents[i]) for i in best]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return index size and age"""
+        return {
+            "chunks": len(self.documents),
+            "terms": len(self.terms),
+            "loaded_at": self.loaded_at
+        }
+
+# Current index, replaced wholesale on every refresh
+index: Optional[PolicyIndex] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+async def load_policy_index() -> PolicyIndex:
+    """Load every policy chunk from the search index into a new local index"""
+    global index
+
+    documents = []
+    while True:
+        page = await run_search(
+            search_clients.policy_search_client,
+            guarded=False,
+            search_text="*",
+            select=POLICY_SELECT_FIELDS,
+            top=POLICY_PAGE_SIZE,
+            skip=len(documents)
+        )
+        documents.extend(page)
+        if len(page) < POLICY_PAGE_SIZE:
+            break
+
+    # Building the matrices is CPU work, keep it off the event loop
+    index = await asyncio.to_thread(PolicyIndex, documents)
+    logger.info(f"Policy index loaded with {len(index)} chunks and {len(index.terms)} terms")
+    return index
+
+async def _refresh_loop():
+    # An index inherited from a preloading parent process is served until it is due
+    if index is not None:
+        await asyncio.sleep(max(0.0, index.loaded_at + POLICY_INDEX_REFRESH_SECONDS - time.time()))
+    while True:
+        try:
+            await load_policy_index()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the previous index
+            logger.error(f"Policy index refresh failed: {e}")
+        await asyncio.sleep(POLICY_INDEX_REFRESH_SECONDS)
+
+def start_policy_refresh():
+    """Start the periodic policy index refresh in the background"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def stop_policy_refresh():
+    """Stop the periodic policy index refresh"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,165 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+import os
+from dotenv import load_dotenv
+import logging
+from api.retrieval import ProductHit
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Prompt budget settings
+PROMPT_INPUT_TOKEN_BUDGET = int(os.getenv('PROMPT_INPUT_TOKEN_BUDGET', '3000'))
+PROMPT_HISTORY_MESSAGES = int(os.getenv('PROMPT_HISTORY_MESSAGES', '10'))
+PROMPT_DESCRIPTION_TOKENS = int(os.getenv('PROMPT_DESCRIPTION_TOKENS', '80'))
+PROMPT_CONTEXT_ITEMS = int(os.getenv('PROMPT_CONTEXT_ITEMS', '3'))
+
+# Role and separator tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Estimate without tiktoken, on the low side for Turkish so budgets are not overrun
+CHARS_PER_TOKEN = 3
+
+class TokenCounter:
+    """Counts and truncates text in model tokens, estimating if tiktoken is unavailable"""
+
+    def __init__(self, model: str = 'gpt-4'):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        # History turns and descriptions repeat across requests
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> Tuple[str, bool]:
+        """Cut text to at most max_tokens, returning it and whether it was cut"""
+        if max_tokens <= 0:
+            return '', bool(text)
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            if len(tokens) <= max_tokens:
+                return text, False
+            return self._encoding.decode(tokens[:max_tokens]), True
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        return text[:max_chars], len(text) > max_chars
+
+class PromptBuilder:
+    """Assembles the chat prompt within an input token budget
+
+    The system prompt is counted once up front. Product or policy context
+    is added in ranking order until the budget runs out, and then as many
+    of the most recent history messages as still fit.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        input_budget: int = PROMPT_INPUT_TOKEN_BUDGET,
+        history_messages: int = PROMPT_HISTORY_MESSAGES,
+        description_tokens: int = PROMPT_DESCRIPTION_TOKENS,
+        context_items: int = PROMPT_CONTEXT_ITEMS,
+        counter: TokenCounter = None
+    ):
+        self.counter = counter or TokenCounter()
+        self.input_budget = input_budget
+        self.history_messages = history_messages
+        self.description_tokens = description_tokens
+        self.context_items = context_items
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.system_tokens = self.counter.count(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def intent(products: List[ProductHit]) -> str:
+        """'policy', 'product' or 'general' depending on the retrieved context"""
+        if not products:
+            return 'general'
+        if any(product.type == 'policy' for product in products):
+            return 'policy'
+        return 'product'
+
+    def _policy_block(self, index: int, product: ProductHit, budget: int) -> str:
+        description = product.description or 'Bilgi yok'
+        description, _ = self.counter.truncate(description, budget - self.counter.count(f"{index}. \n\n"))
+        return f"""{index}. {description}\n\n"""
+
+    def _product_block(self, index: int, product: ProductHit, budget: int) -> str:
+        colors = ", ".join(product.color) if product.color else "Renk bilgisi yok"
+        brand = product.brand or 'Marka bilgisi yok'
+        category = product.category or 'Kategori bilgisi yok'
+        description = product.description or 'Açıklama yok'
+        description, truncated = self.counter.truncate(description, self.description_tokens)
+
+        return f"""{index}. {product.title}
+   Marka: {brand}
+   Kategori: {category}
+   Renkler: {colors}
+   Fiyat: {product.price if product.price else 'Fiyat bilgisi için mağazamızı arayın'}
+   Detaylar: {description}{'...' if truncated else ''}
+\n"""
+
+    def _context(self, products: List[ProductHit], intent: str, budget: int) -> str:
+        """Product or policy context, best ranked items first, within the budget"""
+        if intent == 'general':
+            return ""
+
+        if intent == 'policy':
+            header = "\n\nBulunan policy bilgileri:\n"
+            items = [(i, product) for i, product in enumerate(products[:self.context_items], 1) if product.type == 'policy']
+            make_block = self._policy_block
+        else:
+            header = "\n\nBulunan ürünler (detaylı bilgiler):\n"
+            items = list(enumerate(products[:self.context_items], 1))
+            make_block = self._product_block
+
+        context = header
+        budget -= self.counter.count(header)
+        for index, product in items:
+            block = make_block(index, product, budget)
+            cost = self.counter.count(block)
+            if cost > budget:
+                break
+            context += block
+            budget -= cost
+        return context
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Tokens a message list uses, format overhead included"""
+        return sum(self.counter.count(msg['content']) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+    def build(self, message: str, history: List[Any], products: List[ProductHit]) -> List[Dict[str, str]]:
+        """Return the message list for the request"""
+        intent = self.intent(products)
+        budget = self.input_budget - self.system_tokens - self.counter.count(message) - MESSAGE_OVERHEAD_TOKENS
+
+        context = self._context(products, intent, budget)
+        budget -= self.counter.count(context)
+
+        # Most recent history first, stopping at the first message that does not fit
+        history_messages = []
+        for msg in reversed(history[-self.history_messages:] if self.history_messages else []):
+            cost = self.counter.count(msg.content) + MESSAGE_OVERHEAD_TOKENS
+            if cost > budget:
+                break
+            history_messages.append({"role": msg.role, "content": msg.content})
+            budget -= cost
+        history_messages.reverse()
+
+        messages = [self.system_message] + history_messages
+        messages.append({"role": "user", "content": f"{message}{context}"})
+        return messages
@@ -0,0 +1,176 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Optional
+import json
+import threading
+import time
+import os
+from dotenv import load_dotenv
+import logging
+from api.text_utils import turkish_casefold
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Vocabulary data file, checked for changes at most every few seconds
+QUERY_VOCABULARY_PATH = os.getenv(
+    'QUERY_VOCABULARY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_vocabulary.json')
+)
+QUERY_VOCABULARY_CHECK_SECONDS = float(os.getenv('QUERY_VOCABULARY_CHECK_SECONDS', '5'))
+
+class AhoCorasick:
+    """Multi-pattern substring matcher that scans text in a single pass"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Any]] = [[]]
+
+        for pattern, payload in patterns:
+            if pattern:
+                self._insert(pattern, payload)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, payload: Any):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._out[state].append(payload)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Any]:
+        """Yield the payload of every pattern occurring in the text"""
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            yield from self._out[state]
+
+@dataclass
+class QueryIntents:
+    """Intents found in a query"""
+    is_policy: bool = False
+    is_comparison: bool = False
+    is_small_talk: bool = False
+    product_ids: List[str] = field(default_factory=list)
+    colors: Dict[str, List[str]] = field(default_factory=dict)
+
+class QueryClassifier:
+    """Classifies a query into policy, comparison, small talk, product id, product name and color intents"""
+
+    def __init__(self, vocabulary: Dict[str, Any]):
+        self.colors: Dict[str, List[str]] = vocabulary.get('colors', {})
+
+        # Vocabulary order decides priority between product names and colors
+        self._name_rank = {name: rank for rank, name in enumerate(vocabulary.get('product_names', {}))}
+        self._color_rank = {color: rank for rank, color in enumerate(self.colors)}
+
+        patterns = []
+        patterns += [(keyword, ('policy', None)) for keyword in vocabulary.get('policy', [])]
+        patterns += [(keyword, ('comparison', None)) for keyword in vocabulary.get('comparison', [])]
+        patterns += [(keyword, ('small_talk', None)) for keyword in vocabulary.get('small_talk', [])]
+        patterns += [(text, ('product_id', product_id)) for text, product_id in vocabulary.get('product_ids', {}).items()]
+        patterns += [(name, ('product_name', (name, product_id))) for name, product_id in vocabulary.get('product_names', {}).items()]
+        patterns += [(color, ('color', color)) for color in self.colors]
+        self._matcher = AhoCorasick((turkish_casefold(text), payload) for text, payload in patterns)
+
+    def classify(self, query: str) -> QueryIntents:
+        """Classify a query in one pass over its casefolded text"""
+        intents = QueryIntents()
+        product_ids = []
+        names = {}
+        colors = set()
+
+        for intent, value in self._matcher.iter_matches(turkish_casefold(query)):
+            if intent == 'policy':
+                intents.is_policy = True
+            elif intent == 'comparison':
+                intents.is_comparison = True
+            elif intent == 'small_talk':
+                intents.is_small_talk = True
+            elif intent == 'product_id':
+                if value not in product_ids:
+                    product_ids.append(value)
+            elif intent == 'product_name':
+                names[value[0]] = value[1]
+            elif intent == 'color':
+                colors.add(value)
+
+        # Naming two different models is a comparison even without a cue word
+        if len(set(product_ids) | set(names.values())) > 1:
+            intents.is_comparison = True
+
+        # Only the first matching product name is used, as one query is about one model
+        if names:
+            first_name = min(names, key=self._name_rank.__getitem__)
+            if names[first_name] not in product_ids:
+                product_ids.append(names[first_name])
+
+        intents.product_ids = product_ids
+        intents.colors = {color: self.colors[color] for color in sorted(colors, key=self._color_rank.__getitem__)}
+        return intents
+
+_classifier: Optional[QueryClassifier] = None
+_vocabulary_mtime: Optional[float] = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+def load_classifier() -> QueryClassifier:
+    """Build the classifier from the vocabulary file"""
+    global _classifier, _vocabulary_mtime
+
+    with _lock:
+        mtime = os.path.getmtime(QUERY_VOCABULARY_PATH)
+        with open(QUERY_VOCABULARY_PATH, 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        _classifier = QueryClassifier(vocabulary)
+        _vocabulary_mtime = mtime
+
+    logger.info(f"Query vocabulary loaded from {QUERY_VOCABULARY_PATH}")
+    return _classifier
+
+def get_classifier() -> QueryClassifier:
+    """Return the classifier, reloading it if the vocabulary file changed"""
+    global _last_check
+
+    now = time.monotonic()
+    if _classifier is not None and now - _last_check < QUERY_VOCABULARY_CHECK_SECONDS:
+        return _classifier
+    _last_check = now
+
+    try:
+        if _classifier is None or os.path.getmtime(QUERY_VOCABULARY_PATH) != _vocabulary_mtime:
+            return load_classifier()
+    except Exception as e:
+        # Keep the current vocabulary if the new file is broken
+        logger.error(f"Error loading query vocabulary: {e}")
+        if _classifier is None:
+            raise
+    return _classifier
+
+def classify_query(query: str) -> QueryIntents:
+    """Classify a query with the current vocabulary"""
+    return get_classifier().classify(query)
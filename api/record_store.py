@@ -0,0 +1,197 @@
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
+import json
+import threading
+import os
+from dotenv import load_dotenv
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns the store
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Record store settings
+RECORD_SEGMENT_BYTES = int(os.getenv('RECORD_SEGMENT_BYTES', str(8 * 1024 * 1024)))
+
+class _Segment:
+    """One JSONL segment file with its record count, first timestamp and the bytes counted so far"""
+    __slots__ = ('path', 'count', 'first_timestamp', 'size')
+
+    def __init__(self, path: str, count: int = 0, first_timestamp: Optional[str] = None):
+        self.path = path
+        self.count = count
+        self.first_timestamp = first_timestamp
+        self.size = 0
+
+class SegmentedRecordStore:
+    """Append-only record store split into size-rotated JSONL segments
+
+    Records live in {directory}/{name}/000001.jsonl, 000002.jsonl, ... and
+    are always appended to the last segment. A legacy {directory}/{name}.json
+    array is imported once and renamed to {name}.json.migrated.
+
+    Several processes can share a store: appends and the import hold an
+    exclusive lock on {name}/.lock, and every read or append first picks up
+    segments and records other processes added since the last one.
+    """
+
+    def __init__(self, directory: str, name: str, max_segment_bytes: int = RECORD_SEGMENT_BYTES,
+                 timestamp_field: str = 'created_at'):
+        self.directory = directory
+        self.name = name
+        self.max_segment_bytes = max_segment_bytes
+        self.timestamp_field = timestamp_field
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+
+    @property
+    def _segment_dir(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+    @property
+    def _legacy_path(self) -> str:
+        return os.path.join(self.directory, f'{self.name}.json')
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self._segment_dir, f'{number:06d}.jsonl')
+
+    @staticmethod
+    def _iter_lines(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[tuple]:
+        """Yield (end offset, record) for the complete lines between two byte offsets
+
+        The record is None for blank and unreadable lines, so callers can
+        still advance past them.
+        """
+        with open(path, 'rb') as f:
+            f.seek(start)
+            position = start
+            for line in f:
+                # A line still being appended by another process
+                if not line.endswith(b'\n') or (end is not None and position + len(line) > end):
+                    return
+                position += len(line)
+                record = None
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        # A torn line from a crash mid-append
+                        logger.warning(f"Skipping unreadable line in {path}")
+                yield position, record
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Exclude other processes from appending or importing"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self._segment_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _refresh(self) -> List[_Segment]:
+        """Pick up segments and records added since the last call, by this or another process
+
+        Sealed segments never change, so only growth past the bytes already
+        counted is read.
+        """
+        os.makedirs(self._segment_dir, exist_ok=True)
+        known = {segment.path: segment for segment in self._segments}
+        segments = []
+        for filename in sorted(os.listdir(self._segment_dir)):
+            if not filename.endswith('.jsonl'):
+                continue
+            path = os.path.join(self._segment_dir, filename)
+            segment = known.get(path) or _Segment(path)
+            if os.path.getsize(path) > segment.size:
+                for position, record in self._iter_lines(path, segment.size):
+                    segment.size = position
+                    if record is None:
+                        continue
+                    if segment.count == 0:
+                        segment.first_timestamp = record.get(self.timestamp_field)
+                    segment.count += 1
+            segments.append(segment)
+        self._segments = segments
+        return segments
+
+    def _import_legacy(self):
+        """Import the legacy JSON file into the first segment, once across processes"""
+        if self._segments or not os.path.exists(self._legacy_path):
+            return
+        with open(self._legacy_path, 'r', encoding='utf-8') as f:
+            legacy_records = json.load(f)
+        for record in legacy_records:
+            self._append_locked(record)
+        os.replace(self._legacy_path, self._legacy_path + '.migrated')
+        logger.info(f"Imported {len(legacy_records)} records from {self._legacy_path}")
+
+    def _open(self) -> List[_Segment]:
+        """Current segment metadata, importing the legacy JSON file on first use"""
+        segments = self._refresh()
+        if not segments and os.path.exists(self._legacy_path):
+            with self._file_lock():
+                # Another process may have imported it while we waited
+                self._refresh()
+                self._import_legacy()
+        return self._segments
+
+    def _append_locked(self, record: Dict[str, Any]):
+        segments = self._segments
+        if not segments or segments[-1].size >= self.max_segment_bytes:
+            segments.append(_Segment(self._segment_path(len(segments) + 1)))
+
+        segment = segments[-1]
+        line = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        with open(segment.path, 'ab') as f:
+            f.write(line)
+        if segment.count == 0:
+            segment.first_timestamp = record.get(self.timestamp_field)
+        segment.count += 1
+        segment.size += len(line)
+
+    def append(self, record: Dict[str, Any]):
+        """Append one record to the current segment"""
+        with self._lock:
+            os.makedirs(self._segment_dir, exist_ok=True)
+            with self._file_lock():
+                self._refresh()
+                self._import_legacy()
+                self._append_locked(record)
+
+    def iter_records(self, offset: int = 0, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield records oldest first, starting at an offset or a timestamp
+
+        Whole segments before the offset, or whose successor starts at or
+        before the timestamp, are skipped without being read.
+        """
+        with self._lock:
+            # Counts as of now; records appended while reading are left for the next call
+            segments = [(segment.path, segment.count, segment.first_timestamp, segment.size) for segment in self._open()]
+
+        start = 0
+        if since is not None:
+            while start + 1 < len(segments) and (segments[start + 1][2] or '') <= since:
+                start += 1
+
+        skip = offset
+        for path, count, _, size in segments[start:]:
+            if since is None and skip >= count:
+                skip -= count
+                continue
+            for _, record in self._iter_lines(path, end=size):
+                if record is None:
+                    continue
+                if since is not None and (record.get(self.timestamp_field) or '') < since:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                yield record
@@ -0,0 +1,129 @@
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Tuple, Awaitable
+import asyncio
+import os
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Retrieval planner settings
+RETRIEVAL_DEADLINE_SECONDS = float(os.getenv('RETRIEVAL_DEADLINE_SECONDS', '4.0'))
+RETRIEVAL_ENOUGH_RESULTS = int(os.getenv('RETRIEVAL_ENOUGH_RESULTS', '5'))
+RETRIEVAL_MIN_SCORE = float(os.getenv('RETRIEVAL_MIN_SCORE', '1.0'))
+
+# Product fields fetched from the index, only what the prompt and the lookups use
+PRODUCT_SELECT_FIELDS = [field.strip() for field in os.getenv(
+    'PRODUCT_SELECT_FIELDS', 'id,name,brand,category,color,price,url,description'
+).split(',') if field.strip()]
+
+POLICY_TITLE = 'SSS ve İade Politikası'
+
+@dataclass(frozen=True, slots=True)
+class ProductHit:
+    """One product or policy search result"""
+    id: str
+    title: str
+    description: str
+    score: float
+    price: str = ''
+    color: Tuple[str, ...] = ()
+    category: str = ''
+    brand: str = ''
+    url: str = ''
+    type: str = 'product'
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any], default_score: float) -> "ProductHit":
+        """Build a hit from a product index document, using its search score if it has one"""
+        return cls(
+            id=document.get('id', ''),
+            title=document.get('name', ''),
+            description=document.get('description') or '',
+            score=document.get('@search.score', default_score),
+            price=document.get('price') or '',
+            color=tuple(document.get('color') or ()),
+            category=document.get('category') or '',
+            brand=document.get('brand') or '',
+            url=document.get('url') or ''
+        )
+
+    @classmethod
+    def policy(cls, document: Dict[str, Any]) -> "ProductHit":
+        """Build a hit from a policy chunk"""
+        return cls(
+            id=document.get('id', ''),
+            title=POLICY_TITLE,
+            description=document.get('chunk', ''),
+            score=document.get('@search.score', 1.0),
+            category='policy',
+            brand='MFT Leather',
+            type='policy'
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The hit as the JSON object returned to clients"""
+        record = asdict(self)
+        record['color'] = list(self.color)
+        return record
+
+# A plan is a list of (strategy name, coroutine returning hits)
+RetrievalPlan = List[Tuple[str, Awaitable[List[ProductHit]]]]
+
+def merge_results(merged: Dict[str, ProductHit], results: List[ProductHit]):
+    """Merge hits into an id-keyed dict, keeping the highest score"""
+    for result in results:
+        existing = merged.get(result.id)
+        if existing is None or result.score > existing.score:
+            merged[result.id] = result
+
+def has_enough_results(merged: Dict[str, ProductHit], enough: int, min_score: float) -> bool:
+    """Check whether enough high-scoring results have been collected"""
+    strong = sum(1 for result in merged.values() if result.score >= min_score)
+    return strong >= enough
+
+async def run_plan(
+    plan: RetrievalPlan,
+    deadline: float = RETRIEVAL_DEADLINE_SECONDS,
+    enough: int = RETRIEVAL_ENOUGH_RESULTS,
+    min_score: float = RETRIEVAL_MIN_SCORE
+) -> List[ProductHit]:
+    """Run independent search strategies concurrently and merge their results
+
+    Strategies that are still running when the deadline passes, or once
+    enough high-scoring results have arrived, are cancelled.
+    """
+    tasks = {asyncio.ensure_future(coro): name for name, coro in plan}
+    pending = set(tasks)
+    merged: Dict[str, ProductHit] = {}
+
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+
+    try:
+        while pending:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                logger.warning(f"Retrieval deadline reached, cancelling: {sorted(tasks[t] for t in pending)}")
+                break
+
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                try:
+                    merge_results(merged, task.result())
+                except Exception as e:
+                    logger.warning(f"Search strategy '{tasks[task]}' failed: {str(e)}")
+
+            if pending and has_enough_results(merged, enough, min_score):
+                logger.info(f"Enough results collected, cancelling: {sorted(tasks[t] for t in pending)}")
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    return sorted(merged.values(), key=lambda x: x.score, reverse=True)
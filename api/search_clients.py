@@ -0,0 +1,125 @@
+from azure.search.documents.aio import SearchClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from typing import List, Dict, Any, Optional
+import aiohttp
+import json
+import os
+from dotenv import load_dotenv
+import logging
+from api.cache import TTLCache
+from api.search_resilience import SearchGuard
+from api import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Azure Search configuration
+AZURE_SEARCH_ENDPOINT = os.getenv('AZURE_SEARCH_ENDPOINT')
+AZURE_SEARCH_KEY = os.getenv('AZURE_SEARCH_API_KEY')
+AZURE_SEARCH_INDEX = os.getenv('AZURE_SEARCH_INDEX', 'mftleather')
+POLICY_SEARCH_INDEX = 'policy'
+
+# Connection pool settings for the shared HTTP transport
+SEARCH_POOL_SIZE = int(os.getenv('SEARCH_POOL_SIZE', '50'))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv('SEARCH_TIMEOUT_SECONDS', '10'))
+
+# Last good results per search, served when the index is failing or its circuit is open
+fallback_cache = TTLCache(
+    "search_fallback",
+    max_entries=int(os.getenv('SEARCH_FALLBACK_CACHE_ENTRIES', '2048')),
+    ttl=float(os.getenv('SEARCH_FALLBACK_TTL', '86400'))
+)
+
+# Shared state, created on application startup
+_http_session: Optional[aiohttp.ClientSession] = None
+search_client: Optional[SearchClient] = None
+policy_search_client: Optional[SearchClient] = None
+# Hedging and circuit breaker per index
+guards: Dict[str, SearchGuard] = {
+    AZURE_SEARCH_INDEX: SearchGuard(AZURE_SEARCH_INDEX),
+    POLICY_SEARCH_INDEX: SearchGuard(POLICY_SEARCH_INDEX)
+}
+_guard_by_client: Dict[int, SearchGuard] = {}
+
+async def open_search_clients():
+    """Create the async Search clients on one pooled HTTP session"""
+    global _http_session, search_client, policy_search_client
+
+    if _http_session is not None:
+        return
+
+    _http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=SEARCH_POOL_SIZE, ttl_dns_cache=300),
+        timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT_SECONDS)
+    )
+    # The session is owned here so closing one client does not close it for the other
+    transport = AioHttpTransport(session=_http_session, session_owner=False)
+    credential = AzureKeyCredential(AZURE_SEARCH_KEY)
+
+    search_client = SearchClient(
+        endpoint=AZURE_SEARCH_ENDPOINT,
+        index_name=AZURE_SEARCH_INDEX,
+        credential=credential,
+        transport=transport
+    )
+    policy_search_client = SearchClient(
+        endpoint=AZURE_SEARCH_ENDPOINT,
+        index_name=POLICY_SEARCH_INDEX,
+        credential=credential,
+        transport=transport
+    )
+    _guard_by_client[id(search_client)] = guards[AZURE_SEARCH_INDEX]
+    _guard_by_client[id(policy_search_client)] = guards[POLICY_SEARCH_INDEX]
+    logger.info(f"Azure Search clients ready (pool size {SEARCH_POOL_SIZE})")
+
+async def close_search_clients():
+    """Close the Search clients and the shared HTTP session"""
+    global _http_session, search_client, policy_search_client
+
+    for search in (search_client, policy_search_client):
+        if search is not None:
+            try:
+                await search.close()
+            except Exception as e:
+                logger.warning(f"Error closing search client: {e}")
+
+    if _http_session is not None:
+        await _http_session.close()
+
+    _http_session = None
+    _guard_by_client.clear()
+    search_client = None
+    policy_search_client = None
+
+async def _collect(client: SearchClient, **kwargs) -> List[Dict[str, Any]]:
+    results = await client.search(**kwargs)
+    return [result async for result in results]
+
+async def run_search(client: SearchClient, guarded: bool = True, **kwargs) -> List[Dict[str, Any]]:
+    """Run a search and collect every result without blocking the event loop
+
+    Guarded searches go through the index's guard (hedging, bounded latency
+    and a circuit breaker). If that fails, the last good results for the same
+    search are returned, and the error is raised only if there are none.
+    """
+    guard = _guard_by_client.get(id(client)) if guarded else None
+    if guard is None:
+        return await _collect(client, **kwargs)
+
+    cache_key = (guard.name, json.dumps(kwargs, sort_keys=True, default=str))
+    try:
+        results = await guard.call(lambda: _collect(client, **kwargs))
+    except Exception as e:
+        stale = fallback_cache.get(cache_key)
+        if stale is None:
+            raise
+        logger.warning(f"Search on {guard.name} failed ({type(e).__name__}), serving last good results")
+        metrics.fallbacks.inc(kind="search_stale_results")
+        return list(stale)
+
+    fallback_cache.set(cache_key, results)
+    return results
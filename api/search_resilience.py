@@ -0,0 +1,180 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import time
+import os
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Hedging settings
+SEARCH_HEDGE_PERCENTILE = float(os.getenv('SEARCH_HEDGE_PERCENTILE', '95'))
+SEARCH_HEDGE_DEFAULT_DELAY = float(os.getenv('SEARCH_HEDGE_DEFAULT_DELAY', '0.5'))
+SEARCH_HEDGE_MAX_RATIO = float(os.getenv('SEARCH_HEDGE_MAX_RATIO', '0.1'))
+SEARCH_HEDGE_MIN_SAMPLES = 20
+# Upper bound on one search, hedge included
+SEARCH_ATTEMPT_TIMEOUT = float(os.getenv('SEARCH_ATTEMPT_TIMEOUT', '3'))
+
+# Circuit breaker settings
+SEARCH_BREAKER_WINDOW = int(os.getenv('SEARCH_BREAKER_WINDOW', '50'))
+SEARCH_BREAKER_MIN_CALLS = int(os.getenv('SEARCH_BREAKER_MIN_CALLS', '10'))
+SEARCH_BREAKER_FAILURE_RATIO = float(os.getenv('SEARCH_BREAKER_FAILURE_RATIO', '0.5'))
+SEARCH_BREAKER_SLOW_SECONDS = float(os.getenv('SEARCH_BREAKER_SLOW_SECONDS', '2'))
+SEARCH_BREAKER_OPEN_SECONDS = float(os.getenv('SEARCH_BREAKER_OPEN_SECONDS', '30'))
+
+class CircuitOpenError(Exception):
+    """The dependency is marked unhealthy and is not being called"""
+
+class CircuitBreaker:
+    """Opens after too many failed or slow calls, then lets one probe through
+
+    States are 'closed' (calls pass), 'open' (calls fail fast for
+    open_seconds) and 'half_open' (a single probe decides which way to go).
+    """
+
+    def __init__(self, name: str, window: int = SEARCH_BREAKER_WINDOW, min_calls: int = SEARCH_BREAKER_MIN_CALLS,
+                 failure_ratio: float = SEARCH_BREAKER_FAILURE_RATIO, slow_seconds: float = SEARCH_BREAKER_SLOW_SECONDS,
+                 open_seconds: float = SEARCH_BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = 'closed'
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        if self.state == 'open':
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit for {self.name} is open")
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit for {self.name} is half open")
+            self._probing = True
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        """Record a call's outcome, a slow success counts as a failure"""
+        failed = not ok or (latency is not None and latency > self.slow_seconds)
+        if self.state == 'half_open':
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self.state = 'closed'
+                self._outcomes.clear()
+                logger.info(f"Circuit for {self.name} closed")
+            return
+
+        self._outcomes.append(failed)
+        if (len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio):
+            self._open()
+
+    def abandon(self):
+        """Forget a call that was cancelled before it finished"""
+        if self.state == 'half_open':
+            self._probing = False
+
+    def _open(self):
+        self.state = 'open'
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+        logger.warning(f"Circuit for {self.name} opened for {self.open_seconds}s")
+
+class SearchGuard:
+    """Hedged, time-bounded calls to one search index behind a circuit breaker
+
+    A duplicate request is sent when the first has not answered within the
+    recent latency percentile; whichever finishes first wins. The total
+    time of a call, hedge included, is bounded by timeout.
+    """
+
+    def __init__(self, name: str, timeout: float = SEARCH_ATTEMPT_TIMEOUT,
+                 hedge_percentile: float = SEARCH_HEDGE_PERCENTILE, max_hedge_ratio: float = SEARCH_HEDGE_MAX_RATIO):
+        self.name = name
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.breaker = CircuitBreaker(name)
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        """Delay before hedging, the configured percentile of recent latencies"""
+        if len(self._latencies) < SEARCH_HEDGE_MIN_SAMPLES:
+            return SEARCH_HEDGE_DEFAULT_DELAY
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            # Hedges are capped to a share of calls so a slow service is not sent twice the load
+            if not done and self.hedged < self.max_hedge_ratio * self.calls:
+                self.hedged += 1
+                tasks.add(asyncio.ensure_future(fn()))
+
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                tasks = pending
+                if not tasks:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn with hedging and the circuit breaker"""
+        self.breaker.before_call()
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._hedged(fn), timeout=self.timeout)
+        except asyncio.CancelledError:
+            # The caller gave up, which says nothing about the service
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(ok=False)
+            raise
+
+        latency = time.monotonic() - started
+        self._latencies.append(latency)
+        self.breaker.record(ok=True, latency=latency)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Return breaker state and hedging counters"""
+        return {
+            "name": self.name,
+            "circuit": self.breaker.state,
+            "opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": round(self.hedge_delay(), 4)
+        }
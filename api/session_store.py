@@ -0,0 +1,332 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
+import asyncio
+import glob
+import itertools
+import json
+import threading
+import time
+import os
+from dotenv import load_dotenv
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns the directory
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Session log settings
+SESSIONS_DIR = os.getenv('SESSIONS_DIR', 'sessions')
+SESSION_FSYNC = os.getenv('SESSION_FSYNC', 'true').lower() == 'true'
+SESSION_COMPACT_BYTES = int(os.getenv('SESSION_COMPACT_BYTES', str(64 * 1024)))
+SESSION_COMPACT_INTERVAL = float(os.getenv('SESSION_COMPACT_INTERVAL', '60'))
+# Sessions share a fixed set of locks, hashed by id, instead of holding one each forever
+SESSION_LOCK_STRIPES = int(os.getenv('SESSION_LOCK_STRIPES', '64'))
+
+class SessionLogStore:
+    """Per-session append-only JSONL log with background compaction
+
+    Each session has up to three kinds of files in the sessions directory:
+
+    - session_{id}.log.jsonl       active segment, one record appended per write
+    - session_{id}.{n}.seg.jsonl   sealed segments waiting to be compacted
+    - session_{id}.snapshot.jsonl  compacted history, header line then records
+
+    Sessions written by older versions as session_{id}.json are read as is
+    and converted to a snapshot the next time they are compacted.
+
+    Several worker processes can share the directory: appends hold a shared
+    lock on .lock and sealing a log holds it exclusively, and only the
+    worker holding .compaction.lock runs the compaction loop.
+    """
+
+    def __init__(self, directory: str = SESSIONS_DIR, fsync: bool = SESSION_FSYNC):
+        self.directory = directory
+        self.fsync = fsync
+        self._locks = [threading.Lock() for _ in range(max(1, SESSION_LOCK_STRIPES))]
+        self._dirty: Set[str] = set()
+        self._compact_task: Optional[asyncio.Task] = None
+        self._index_lock = threading.Lock()
+        self._legacy_summaries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._compaction_lock_file = None
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        return self._locks[hash(session_id) % len(self._locks)]
+
+    # File layout
+    def _path(self, session_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'session_{session_id}{suffix}')
+
+    def _log_path(self, session_id: str) -> str:
+        return self._path(session_id, '.log.jsonl')
+
+    def _snapshot_path(self, session_id: str) -> str:
+        return self._path(session_id, '.snapshot.jsonl')
+
+    def _legacy_path(self, session_id: str) -> str:
+        return self._path(session_id, '.json')
+
+    def _segment_paths(self, session_id: str) -> List[str]:
+        pattern = self._path(glob.escape(session_id), '.*.seg.jsonl')
+        return sorted(glob.glob(pattern), key=lambda path: int(path.rsplit('.', 3)[-3]))
+
+    @contextmanager
+    def _directory_lock(self, exclusive: bool) -> Iterator[None]:
+        """Lock the directory against other processes, shared for appends and exclusive for sealing"""
+        if fcntl is None:
+            yield
+            return
+        # A fresh open file per holder, flock would convert one shared descriptor's lock
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    # Writes
+    def append_batch(self, writes: List[Tuple[str, Dict[str, Any]]]):
+        """Append (session_id, record) writes with one fsync per session file"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        by_session: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for session_id, record in writes:
+            by_session[session_id].append(record)
+
+        for session_id, records in by_session.items():
+            lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+            with self._lock(session_id), self._directory_lock(exclusive=False):
+                with open(self._log_path(session_id), 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+            self._dirty.add(session_id)
+
+    # Reads
+    def exists(self, session_id: str) -> bool:
+        """Check whether any file exists for a session"""
+        return (
+            os.path.exists(self._log_path(session_id))
+            or os.path.exists(self._snapshot_path(session_id))
+            or os.path.exists(self._legacy_path(session_id))
+            or bool(self._segment_paths(session_id))
+        )
+
+    @staticmethod
+    def _session_id_from_filename(filename: str) -> Optional[str]:
+        if not filename.startswith('session_'):
+            return None
+        name = filename[len('session_'):]
+        for suffix in ('.log.jsonl', '.snapshot.jsonl', '.json'):
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+        if name.endswith('.seg.jsonl'):
+            return name[:-len('.seg.jsonl')].rsplit('.', 1)[0]
+        return None
+
+    def legacy_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Summaries of the sessions still stored as session_{id}.json, read once
+
+        Every session written through the log is also written to the
+        database, so only these older sessions can be missing from it. The
+        files are never appended to; a session that gets a new turn is in
+        the database from then on.
+        """
+        with self._index_lock:
+            if self._legacy_summaries is None:
+                summaries = {}
+                if os.path.isdir(self.directory):
+                    for filename in os.listdir(self.directory):
+                        if not (filename.startswith('session_') and filename.endswith('.json')):
+                            continue
+                        session_id = filename[len('session_'):-len('.json')]
+                        try:
+                            summaries[session_id] = self.summarize(session_id)
+                        except Exception as e:
+                            logger.error(f"Error reading session {session_id}: {e}")
+                self._legacy_summaries = summaries
+            return dict(self._legacy_summaries)
+
+    @staticmethod
+    def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append
+                        logger.warning(f"Skipping unreadable line in {path}")
+        except FileNotFoundError:
+            return
+
+    def _iter_legacy(self, session_id: str) -> Iterator[Dict[str, Any]]:
+        try:
+            with open(self._legacy_path(session_id), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+
+        yield {"type": "session", "session_id": session_id, "created_at": data.get('created_at'), "merged": []}
+        for message in data.get('messages', []):
+            yield dict(message, type='message')
+        for feedback in data.get('feedbacks', []):
+            yield dict(feedback, type='feedback')
+        if data.get('conversation_history'):
+            yield {"type": "history", "conversation_history": data['conversation_history'], "timestamp": data.get('last_updated')}
+
+    def iter_records(self, session_id: str, include_log: bool = True) -> Iterator[Dict[str, Any]]:
+        """Yield a session's records oldest first without loading the whole history
+
+        The first record is a header with type 'session' when the session has
+        a snapshot or legacy file.
+        """
+        merged: Set[str] = set()
+        if os.path.exists(self._snapshot_path(session_id)):
+            for record in self._iter_jsonl(self._snapshot_path(session_id)):
+                if record.get('type') == 'session':
+                    merged = set(record.get('merged', []))
+                yield record
+        else:
+            yield from self._iter_legacy(session_id)
+
+        for path in self._segment_paths(session_id):
+            if os.path.basename(path) not in merged:
+                yield from self._iter_jsonl(path)
+
+        if include_log:
+            yield from self._iter_jsonl(self._log_path(session_id))
+
+    def summarize(self, session_id: str) -> Dict[str, Any]:
+        """Count messages and feedback and find the first and last timestamps"""
+        summary = {"created_at": None, "last_updated": None, "message_count": 0, "feedback_count": 0}
+        for record in self.iter_records(session_id):
+            record_type = record.get('type')
+            if record_type == 'session':
+                summary['created_at'] = record.get('created_at')
+                continue
+            if record_type == 'message':
+                summary['message_count'] += 1
+            elif record_type == 'feedback':
+                summary['feedback_count'] += 1
+            if record.get('timestamp'):
+                summary['created_at'] = summary['created_at'] or record['timestamp']
+                summary['last_updated'] = record['timestamp']
+        return summary
+
+    # Compaction
+    def compact(self, session_id: str):
+        """Fold sealed segments and the active log into a new snapshot"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Seal the active log so new appends go to a fresh one
+        with self._lock(session_id), self._directory_lock(exclusive=True):
+            self._dirty.discard(session_id)
+            if os.path.exists(self._log_path(session_id)):
+                os.replace(self._log_path(session_id), self._path(session_id, f'.{time.time_ns()}.seg.jsonl'))
+
+        segments = self._segment_paths(session_id)
+        if not segments and not os.path.exists(self._legacy_path(session_id)):
+            return
+
+        records = self.iter_records(session_id, include_log=False)
+        first = next(records, None)
+        if first is None:
+            return
+        if first.get('type') == 'session':
+            header = dict(first)
+        else:
+            header = {"type": "session", "session_id": session_id, "created_at": first.get('timestamp')}
+            records = itertools.chain([first], records)
+        # Readers skip segments listed here if they are still on disk
+        header['merged'] = [os.path.basename(path) for path in segments]
+
+        tmp_path = self._snapshot_path(session_id) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False, default=str) + '\n')
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self._snapshot_path(session_id))
+        for path in segments:
+            os.remove(path)
+        if os.path.exists(self._legacy_path(session_id)):
+            os.remove(self._legacy_path(session_id))
+        logger.info(f"Compacted session {session_id} ({len(segments)} segments)")
+
+    def _large_logs(self) -> Set[str]:
+        """Sessions whose active log on disk has grown past the threshold, whichever process wrote it"""
+        session_ids = set()
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.log.jsonl') and entry.stat().st_size >= SESSION_COMPACT_BYTES:
+                        session_ids.add(self._session_id_from_filename(entry.name))
+        session_ids.discard(None)
+        return session_ids
+
+    def compact_dirty(self):
+        """Compact every session whose active log has grown past the threshold"""
+        for session_id in self._dirty | self._large_logs():
+            try:
+                if (os.path.exists(self._legacy_path(session_id))
+                        or os.path.getsize(self._log_path(session_id)) >= SESSION_COMPACT_BYTES):
+                    self.compact(session_id)
+            except FileNotFoundError:
+                self._dirty.discard(session_id)
+            except Exception as e:
+                logger.error(f"Error compacting session {session_id}: {e}")
+
+    def _acquire_compaction(self) -> bool:
+        """Whether this process runs compaction, taking over from a worker that exited"""
+        if fcntl is None or self._compaction_lock_file is not None:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, '.compaction.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._compaction_lock_file = lock_file
+        logger.info(f"Process {os.getpid()} is compacting {self.directory}")
+        return True
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_COMPACT_INTERVAL)
+            if self._acquire_compaction():
+                await asyncio.to_thread(self.compact_dirty)
+            else:
+                # The compacting worker finds these logs on disk
+                self._dirty.clear()
+
+    def start_compaction(self):
+        """Start background compaction on the running event loop"""
+        if self._compact_task is None or self._compact_task.done():
+            self._compact_task = asyncio.create_task(self._compact_loop())
+
+    async def stop_compaction(self):
+        """Stop background compaction"""
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            try:
+                await self._compact_task
+            except asyncio.CancelledError:
+                pass
+            self._compact_task = None
+        if self._compaction_lock_file is not None:
+            self._compaction_lock_file.close()
+            self._compaction_lock_file = None
+
+session_store = SessionLogStore()
@@ -0,0 +1,106 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+import asyncio
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class _SharedStream:
+    """One upstream stream buffered for every caller reading it"""
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._consume(source))
+
+    async def _consume(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                async with self._changed:
+                    self.items.append(item)
+                    self._changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def wait(self, seen: int):
+        """Wait until there are more than seen items or the stream has ended"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self.items) > seen or self.done)
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one in-flight upstream call
+
+    Callers with the same key while a call is running share its result
+    instead of starting their own. A caller that goes away does not cancel
+    the shared call for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def _forget_when_done(self, registry: Dict[Hashable, Any], key: Hashable, entry: Any, task: asyncio.Future):
+        def done(finished: asyncio.Future):
+            if registry.get(key) is entry:
+                del registry[key]
+            # Mark the error as retrieved in case every caller has gone
+            if not finished.cancelled():
+                finished.exception()
+        task.add_done_callback(done)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with concurrent calls for the same key"""
+        self.calls += 1
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._forget_when_done(self._calls, key, task, task)
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, make_stream: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Yield make_stream()'s items, sharing one upstream stream per key
+
+        Callers joining late get the items already produced first.
+        """
+        self.calls += 1
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(make_stream())
+            self._streams[key] = shared
+            self._forget_when_done(self._streams, key, shared, shared.task)
+        else:
+            self.collapsed += 1
+
+        seen = 0
+        while True:
+            while seen < len(shared.items):
+                yield shared.items[seen]
+                seen += 1
+            if shared.done:
+                break
+            await shared.wait(seen)
+
+        if shared.error is not None:
+            raise shared.error
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call and collapsed counters"""
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._calls) + len(self._streams)
+        }
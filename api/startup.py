@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator
+import asyncio
+import gc
+import time
+import os
+from dotenv import load_dotenv
+import logging
+from api import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Run the migrations in the app's startup; gunicorn turns this off and runs them once in the master
+DB_MIGRATE_ON_STARTUP = os.getenv('DB_MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+
+# Seconds spent in each startup step of this process, including steps inherited from a preloading parent
+startup_timings: Dict[str, float] = {}
+
+metrics.register_callback('chatbot_startup_seconds', 'Seconds spent in each startup step', ('step',),
+                          lambda: [((step,), seconds) for step, seconds in startup_timings.items()])
+
+@contextmanager
+def timed(step: str) -> Iterator[None]:
+    """Record how long a startup step takes"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[step] = time.perf_counter() - started
+        logger.info(f"Startup step {step} took {startup_timings[step]:.3f}s")
+
+def migrate_database():
+    """Run the schema migrations and close the connections they used"""
+    from api.database import create_tables, engine
+
+    with timed('migrate'):
+        create_tables()
+        engine.dispose()
+
+async def load_shared_data():
+    """Load the catalog snapshot and the policy index with short-lived search clients"""
+    from api import catalog, policy_index, search_clients
+
+    await search_clients.open_search_clients()
+    try:
+        results = await asyncio.gather(catalog.load_catalog(), policy_index.load_policy_index(), return_exceptions=True)
+        for name, result in zip(('catalog', 'policy index'), results):
+            if isinstance(result, Exception):
+                # The workers' refresh loops load it instead
+                logger.error(f"Preloading the {name} failed: {result}")
+    finally:
+        await search_clients.close_search_clients()
+
+def load_process_data():
+    """Build the lookup tables every request needs so the first one does not pay for them"""
+    from api.query_classifier import get_classifier
+
+    with timed('classifier'):
+        get_classifier()
+
+def preload_for_workers():
+    """Warm read-only data in a preloading parent so forked workers share it
+
+    Everything loaded here is inherited copy-on-write. gc.freeze() moves it
+    out of the collector's reach, otherwise the first collection in each
+    worker touches every object and copies the pages anyway.
+    """
+    with timed('preload'):
+        asyncio.run(load_shared_data())
+    load_process_data()
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,8 @@
+def turkish_casefold(text: str) -> str:
+    """Lowercase text with Turkish rules for dotted and dotless I"""
+    # str.lower() maps 'I' to 'i' and 'İ' to 'i' plus a combining dot
+    return text.replace('I', 'ı').replace('İ', 'i').lower()
+
+def normalize_query(text: str) -> str:
+    """Casefold a query and collapse its whitespace"""
+    return ' '.join(turkish_casefold(text).split())
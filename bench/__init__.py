@@ -0,0 +1,4 @@
+"""Offline benchmark harness: local stand-ins for Azure Search and OpenAI plus a load generator
+
+Run `python -m bench.run --help` from the repository root.
+"""
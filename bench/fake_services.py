@@ -0,0 +1,190 @@
+"""Local stand-ins for Azure AI Search and Azure OpenAI
+
+Serves just enough of both REST APIs for the chatbot's clients: index
+search and document count, chat completions (plain and streamed) and the
+model list. Latency is log-normal with a configured median and p99, and
+a share of calls fails with 503 or is throttled with 429 and Retry-After.
+
+    python -m uvicorn bench.fake_services:app --port 8101
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from bench.fixtures import build_catalog, build_policies
+
+# Latency and failure settings per service
+SEARCH_MEDIAN_MS = float(os.getenv('BENCH_SEARCH_MEDIAN_MS', '40'))
+SEARCH_P99_MS = float(os.getenv('BENCH_SEARCH_P99_MS', '400'))
+SEARCH_ERROR_RATE = float(os.getenv('BENCH_SEARCH_ERROR_RATE', '0'))
+OPENAI_MEDIAN_MS = float(os.getenv('BENCH_OPENAI_MEDIAN_MS', '800'))
+OPENAI_P99_MS = float(os.getenv('BENCH_OPENAI_P99_MS', '4000'))
+OPENAI_ERROR_RATE = float(os.getenv('BENCH_OPENAI_ERROR_RATE', '0'))
+OPENAI_THROTTLE_RATE = float(os.getenv('BENCH_OPENAI_THROTTLE_RATE', '0'))
+# Small deployments answer in a fraction of the time
+OPENAI_FAST_DEPLOYMENTS = set(filter(None, os.getenv('BENCH_OPENAI_FAST_DEPLOYMENTS', 'gpt-4o-mini,gpt-35-turbo').split(',')))
+OPENAI_FAST_FACTOR = float(os.getenv('BENCH_OPENAI_FAST_FACTOR', '0.4'))
+# Streamed completions: delay between chunks
+OPENAI_CHUNK_MS = float(os.getenv('BENCH_OPENAI_CHUNK_MS', '20'))
+CATALOG_SIZE = int(os.getenv('BENCH_CATALOG_SIZE', '300'))
+FAKE_SEED = int(os.getenv('BENCH_SEED', '1'))
+
+Z_99 = 2.326
+
+class LatencyProfile:
+    """Log-normal latency with failure and throttling rates"""
+
+    def __init__(self, median_ms: float, p99_ms: float, error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = FAKE_SEED):
+        self.mu = math.log(max(median_ms, 0.001) / 1000)
+        self.sigma = max(0.0, math.log(max(p99_ms, median_ms) / max(median_ms, 0.001)) / Z_99)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+
+    def delay(self) -> float:
+        return self._rng.lognormvariate(self.mu, self.sigma)
+
+    def failure(self) -> Optional[JSONResponse]:
+        """An error response for this call, or None if it should succeed"""
+        draw = self._rng.random()
+        if draw < self.throttle_rate:
+            return JSONResponse({"error": {"code": "429", "message": "Rate limit exceeded"}}, status_code=429,
+                                headers={"retry-after-ms": str(self._rng.randint(100, 1000))})
+        if draw < self.throttle_rate + self.error_rate:
+            return JSONResponse({"error": {"code": "ServiceUnavailable", "message": "Injected failure"}}, status_code=503)
+        return None
+
+search_profile = LatencyProfile(SEARCH_MEDIAN_MS, SEARCH_P99_MS, SEARCH_ERROR_RATE)
+openai_profile = LatencyProfile(OPENAI_MEDIAN_MS, OPENAI_P99_MS, OPENAI_ERROR_RATE, OPENAI_THROTTLE_RATE, seed=FAKE_SEED + 1)
+
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    'policy': build_policies()
+}
+PRODUCTS = build_catalog(CATALOG_SIZE)
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+ID_FILTER = re.compile(r"id eq '([^']*)'")
+COLOR_FILTER = re.compile(r"c eq '([^']*)'")
+
+# Calls received, by route and outcome, so reports can show upstream load
+calls: Dict[str, int] = {}
+
+app = FastAPI(title="Benchmark fake services")
+
+def _count(route: str):
+    calls[route] = calls.get(route, 0) + 1
+
+def _casefold(text: str) -> str:
+    return text.replace('I', 'ı').replace('İ', 'i').lower()
+
+def _searchable(document: Dict[str, Any]) -> str:
+    return _casefold(" ".join(str(document.get(field, '')) for field in ('id', 'name', 'text', 'chunk', 'category')))
+
+def _search(documents: List[Dict[str, Any]], body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    search_text = body.get('search') or '*'
+    filter_text = body.get('filter') or ''
+    skip = int(body.get('skip') or 0)
+    top = int(body.get('top') or 50)
+
+    ids = set(ID_FILTER.findall(filter_text))
+    colors = set(COLOR_FILTER.findall(filter_text))
+    if ids:
+        documents = [document for document in documents if document['id'] in ids]
+    if colors:
+        documents = [document for document in documents if colors & set(document.get('color') or [])]
+
+    if search_text.strip() in ('', '*'):
+        hits = [(1.0, document) for document in documents]
+    else:
+        # Word overlap stands in for BM25, prefixes (word*) match by prefix
+        terms = [_casefold(term) for term in WORD_PATTERN.findall(search_text) if term.lower() not in ('or', 'and', 'id', 'name')]
+        hits = []
+        for document in documents:
+            words = _searchable(document).split()
+            score = sum(1.0 for term in terms for word in words if word.startswith(term))
+            if score or (ids or colors):
+                hits.append((score, document))
+        hits.sort(key=lambda hit: -hit[0])
+
+    # select is a comma separated field list in the REST body
+    fields = [field.strip() for field in (body.get('select') or '').split(',') if field.strip()]
+    return [dict({key: document[key] for key in fields if key in document} if fields else document, **{'@search.score': score})
+            for score, document in hits[skip:skip + top]]
+
+@app.post("/indexes('{index}')/docs/search.post.search")
+async def search_documents(index: str, request: Request):
+    _count(f"search.{index}")
+    await asyncio.sleep(search_profile.delay())
+    failure = search_profile.failure()
+    if failure is not None:
+        _count(f"search.{index}.failed")
+        return failure
+    body = await request.json()
+    return {"value": _search(INDEXES.get(index, PRODUCTS), body)}
+
+@app.get("/indexes('{index}')/docs/$count")
+async def count_documents(index: str):
+    _count("search.count")
+    return JSONResponse(len(INDEXES.get(index, PRODUCTS)))
+
+def _answer(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """A canned answer whose length follows max_tokens, about 4 characters per token"""
+    question = messages[-1]['content'].split('\n')[0] if messages else ''
+    sentence = f"'{question[:60]}' sorunuz için MFT Leather ürünlerini inceledim. "
+    words = max(10, min(max_tokens, 400) // 2)
+    return (sentence * (words // len(sentence.split()) + 1))[:words * 4].strip()
+
+def _usage(messages: List[Dict[str, Any]], answer: str) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+    completion_tokens = len(answer) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    stream = bool(body.get('stream'))
+    _count(f"openai.{deployment}.{'stream' if stream else 'completion'}")
+    # Time to first token for streams, the whole completion otherwise
+    await asyncio.sleep(openai_profile.delay() * (OPENAI_FAST_FACTOR if deployment in OPENAI_FAST_DEPLOYMENTS else 1.0))
+    failure = openai_profile.failure()
+    if failure is not None:
+        _count(f"openai.{deployment}.{failure.status_code}")
+        return failure
+
+    answer = _answer(body.get('messages', []), int(body.get('max_tokens') or 400))
+    completion_id = f"chatcmpl-{random.getrandbits(48):012x}"
+    created = int(time.time())
+    if not stream:
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": deployment,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": _usage(body.get('messages', []), answer)
+        }
+
+    async def events():
+        words = answer.split(' ')
+        for i in range(0, len(words), 4):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": deployment,
+                "choices": [{"index": 0, "delta": {"content": ' '.join(words[i:i + 4]) + ' '}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            await asyncio.sleep(OPENAI_CHUNK_MS / 1000)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/openai/models")
+async def list_models():
+    _count("openai.models")
+    return {"object": "list", "data": [{"id": "gpt-4", "object": "model"}]}
+
+@app.get("/_bench/calls")
+async def get_calls():
+    """Calls received so far, by route"""
+    return dict(sorted(calls.items()))
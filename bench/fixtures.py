@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Tuple
+import random
+
+# Same seed on every run so reports from different commits see the same data
+FIXTURE_SEED = 20240101
+
+MODELS = ["Vineda", "Retro", "Flother", "Napa", "Tiguan", "Lorca", "Atlas", "Mira", "Sena", "Kuzey"]
+CATEGORIES = ["Çanta", "Cüzdan", "Kartlık", "Kemer", "Sırt Çantası", "Laptop Çantası"]
+COLORS = [
+    "Flother Mat Siyah", "Napa Siyah", "Tiguan Siyah", "Flother Siyah",
+    "Flother Mat Pembe", "Vineda Pembe", "Napa Pembe",
+    "Flother Mat Kahverengi", "Napa Kahverengi", "Tiguan Kahverengi",
+    "Flother Mat Beyaz", "Napa Beyaz", "Flother Mat Mavi", "Napa Mavi"
+]
+
+POLICY_CHUNKS = [
+    "İade: Ürünlerimizi teslim aldığınız tarihten itibaren 14 gün içinde kullanılmamış olması şartıyla iade edebilirsiniz.",
+    "Değişim: Renk veya model değişimi için müşteri hizmetlerimizle iletişime geçmeniz yeterlidir, kargo ücreti bizden.",
+    "Kargo: Siparişler 1-3 iş günü içinde kargoya verilir, 500 TL üzeri alışverişlerde kargo ücretsizdir.",
+    "Garanti: Tüm deri ürünlerimiz üretim hatalarına karşı 2 yıl garantilidir.",
+    "Ödeme: Kredi kartına 9 aya kadar taksit, havale ve kapıda nakit ödeme seçenekleri mevcuttur.",
+    "Kişiselleştirme: Ürünlere isim, yazı veya logo baskısı yapılabilir, üretim süresi 3 iş günü uzar.",
+    "Bakım: Deri ürünlerinizi nemli bezle silin, doğrudan güneş ışığından ve ısıdan uzak tutun.",
+    "Mağaza: İstanbul Nişantaşı mağazamız hafta içi 10:00-20:00 saatleri arasında açıktır.",
+    "Teslimat: Teslimat sırasında hasarlı paketleri kargo görevlisine tutanak tutturarak teslim almayınız.",
+    "Promosyon: Kurumsal promosyon siparişlerinde 50 adet üzeri indirim uygulanır."
+]
+
+# Query mix: (weight, template); {model}, {id} and {color} are filled from the catalog
+QUERY_TEMPLATES: List[Tuple[int, str]] = [
+    (25, "{model} çanta fiyatı nedir"),
+    (15, "{id} ürününü anlatır mısın"),
+    (15, "{color} renkte ne var"),
+    (20, "iade nasıl yapılır"),
+    (10, "kargo ne zaman gelir"),
+    (10, "taksit seçenekleri neler"),
+    (5, "merhaba, hediye için bir şey arıyorum")
+]
+
+def build_catalog(size: int = 300, seed: int = FIXTURE_SEED) -> List[Dict[str, Any]]:
+    """Deterministic product documents shaped like the product index"""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(size):
+        model = MODELS[i % len(MODELS)]
+        category = rng.choice(CATEGORIES)
+        product_id = f"{model.lower()}_{1000 + i}"
+        colors = rng.sample(COLORS, rng.randint(1, 4))
+        documents.append({
+            'id': product_id,
+            'name': f"{model} {category} {1000 + i}",
+            'brand': 'MFT Leather',
+            'category': category,
+            'text': f"{model} serisi el yapımı hakiki deri {category.lower()}.",
+            'description': " ".join(
+                f"{model} {category.lower()} {rng.choice(['dayanıklı', 'şık', 'hafif', 'klasik', 'modern'])} "
+                f"{rng.choice(['dikiş', 'astar', 'fermuar', 'bölme', 'kayış'])} detaylarıyla üretilmiştir."
+                for _ in range(rng.randint(3, 8))
+            ),
+            'price': f"{rng.randint(4, 60) * 50} TL",
+            'color': colors,
+            'url': f"https://example.com/urun/{product_id}"
+        })
+    return documents
+
+def build_policies() -> List[Dict[str, Any]]:
+    """Policy chunks shaped like the policy index"""
+    return [{'id': f"policy_{i}", 'chunk': chunk} for i, chunk in enumerate(POLICY_CHUNKS)]
+
+def build_queries(catalog: List[Dict[str, Any]], count: int = 500, seed: int = FIXTURE_SEED) -> List[str]:
+    """Deterministic chat messages following QUERY_TEMPLATES, with repeats like real traffic"""
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in QUERY_TEMPLATES]
+    templates = [template for _, template in QUERY_TEMPLATES]
+    queries = []
+    for _ in range(count):
+        # Popular products are asked about more often
+        document = catalog[min(len(catalog) - 1, int(rng.paretovariate(1.2)) - 1)]
+        template = rng.choices(templates, weights)[0]
+        queries.append(template.format(
+            model=document['name'].split()[0],
+            id=document['id'].replace('_', ' '),
+            color=document['color'][0].split()[-1].lower()
+        ))
+    return queries
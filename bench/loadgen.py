@@ -0,0 +1,171 @@
+"""Open-loop load generator for the chatbot API
+
+Requests start on a Poisson schedule at the target rate whether or not
+earlier ones have finished, so a slow server shows up as latency and
+dropped requests rather than as a lower offered load.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import random
+import re
+import time
+import uuid
+import httpx
+
+# Share of requests per endpoint
+DEFAULT_MIX: Dict[str, int] = {
+    'chat': 55,
+    'chat_stream': 15,
+    'feedback': 10,
+    'list_sessions': 8,
+    'list_feedback': 6,
+    'list_chat_history': 6
+}
+
+METRIC_LINE = re.compile(r'^(\w+)\{([^}]*)\} (\S+)$')
+LABEL_PAIR = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+@dataclass
+class Sample:
+    endpoint: str
+    started: float
+    latency: float
+    ok: bool
+    status: int
+    first_byte: Optional[float] = None
+
+@dataclass
+class LoadResult:
+    samples: List[Sample] = field(default_factory=list)
+    dropped: int = 0
+    offered: int = 0
+    measured_seconds: float = 0.0
+
+class LoadGenerator:
+    """Drives the API at a target rate with a fixed, seeded request mix"""
+
+    def __init__(self, base_url: str, queries: List[str], rps: float, mix: Dict[str, int] = None,
+                 sessions: int = 50, max_in_flight: int = 500, seed: int = 1, timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.queries = queries
+        self.rps = rps
+        self.mix = mix or DEFAULT_MIX
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+        # A fixed pool of sessions so conversation memory and session lists see reuse
+        self.session_ids = [str(uuid.UUID(int=self._rng.getrandbits(128))) for _ in range(sessions)]
+        self._in_flight = 0
+
+    def _next_request(self) -> Tuple[str, Dict[str, Any]]:
+        endpoints = list(self.mix)
+        endpoint = self._rng.choices(endpoints, [self.mix[name] for name in endpoints])[0]
+        message = self._rng.choice(self.queries)
+        session_id = self._rng.choice(self.session_ids)
+        if endpoint in ('chat', 'chat_stream'):
+            # Some traffic comes without a session, which makes answers cacheable
+            body = {"message": message}
+            if self._rng.random() < 0.7:
+                body["session_id"] = session_id
+            return endpoint, body
+        if endpoint == 'feedback':
+            return endpoint, {
+                "rating": self._rng.choice(['like', 'dislike']),
+                "feedback": "benchmark",
+                "timestamp": "2024-01-01T00:00:00",
+                "conversationHistory": [{"role": "user", "content": message}],
+                "session_id": session_id
+            }
+        return endpoint, {"limit": 100}
+
+    async def _send(self, http: httpx.AsyncClient, endpoint: str, body: Dict[str, Any]) -> Sample:
+        started = time.perf_counter()
+        first_byte = None
+        try:
+            if endpoint == 'chat':
+                response = await http.post('/api/chat', json=body)
+            elif endpoint == 'chat_stream':
+                async with http.stream('POST', '/api/chat/stream', json=body) as response:
+                    async for _ in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - started
+            elif endpoint == 'feedback':
+                response = await http.post('/api/feedback', json=body)
+            else:
+                path = {'list_sessions': '/api/sessions', 'list_feedback': '/api/feedback', 'list_chat_history': '/api/chat-history'}[endpoint]
+                response = await http.get(path, params=body)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        return Sample(endpoint, started, time.perf_counter() - started, 200 <= status < 300, status, first_byte)
+
+    async def _tracked(self, http: httpx.AsyncClient, endpoint: str, body: Dict[str, Any], result: LoadResult, measured: bool):
+        try:
+            sample = await self._send(http, endpoint, body)
+        finally:
+            self._in_flight -= 1
+        if measured:
+            result.samples.append(sample)
+
+    async def run(self, duration: float, warmup: float = 0.0) -> LoadResult:
+        """Offer load for warmup + duration seconds and return the samples after warmup"""
+        result = LoadResult()
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as http:
+            started = time.perf_counter()
+            measure_from = started + warmup
+            stop_at = measure_from + duration
+            next_at = started
+            tasks = set()
+            while True:
+                next_at += self._rng.expovariate(self.rps)
+                if next_at >= stop_at:
+                    break
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                endpoint, body = self._next_request()
+                measured = next_at >= measure_from
+                result.offered += measured
+                if self._in_flight >= self.max_in_flight:
+                    result.dropped += measured
+                    continue
+                self._in_flight += 1
+                task = asyncio.create_task(self._tracked(http, endpoint, body, result, measured))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+            result.measured_seconds = max(1e-9, time.perf_counter() - measure_from)
+        return result
+
+def parse_histograms(text: str, names: Tuple[str, ...]) -> Dict[str, Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]]]:
+    """Histogram series from Prometheus text, as {name: {labels: {'buckets': {le: n}, 'sum': s, 'count': c}}}"""
+    histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Dict[str, Any]]] = {name: {} for name in names}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match is None:
+            continue
+        metric, label_text, value = match.groups()
+        for name in names:
+            if not metric.startswith(name + '_'):
+                continue
+            suffix = metric[len(name) + 1:]
+            labels = dict(LABEL_PAIR.findall(label_text))
+            le = labels.pop('le', None)
+            series = histograms[name].setdefault(tuple(sorted(labels.items())), {'buckets': {}, 'sum': 0.0, 'count': 0})
+            if suffix == 'bucket' and le is not None:
+                series['buckets'][float(le)] = float(value)
+            elif suffix == 'sum':
+                series['sum'] = float(value)
+            elif suffix == 'count':
+                series['count'] = float(value)
+    return histograms
+
+async def scrape_metrics(base_url: str) -> str:
+    """The app's /metrics text, empty if it cannot be read"""
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=10) as http:
+            response = await http.get('/metrics')
+            return response.text if response.status_code == 200 else ''
+    except httpx.HTTPError:
+        return ''
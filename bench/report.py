@@ -0,0 +1,161 @@
+"""Benchmark reports: latency percentiles, throughput, per-stage breakdown and comparisons"""
+from typing import Any, Dict, List, Optional
+import json
+import math
+from bench.loadgen import LoadResult, parse_histograms
+
+STAGE_HISTOGRAM = 'chatbot_stage_seconds'
+REQUEST_HISTOGRAM = 'chatbot_request_seconds'
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def _latency_summary(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / seconds, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0
+    }
+
+def summarize_samples(result: LoadResult) -> Dict[str, Any]:
+    """Per-endpoint and overall latency over successful requests"""
+    by_endpoint: Dict[str, List] = {}
+    for sample in result.samples:
+        by_endpoint.setdefault(sample.endpoint, []).append(sample)
+
+    endpoints = {}
+    for endpoint, samples in sorted(by_endpoint.items()):
+        ok = [sample.latency for sample in samples if sample.ok]
+        endpoints[endpoint] = _latency_summary(ok, len(samples) - len(ok), result.measured_seconds)
+        first_bytes = [sample.first_byte for sample in samples if sample.ok and sample.first_byte is not None]
+        if first_bytes:
+            endpoints[f"{endpoint}.first_byte"] = _latency_summary(first_bytes, 0, result.measured_seconds)
+
+    ok = [sample.latency for sample in result.samples if sample.ok]
+    statuses: Dict[str, int] = {}
+    for sample in result.samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+    return {
+        "overall": dict(_latency_summary(ok, len(result.samples) - len(ok), result.measured_seconds),
+                        offered=result.offered, dropped=result.dropped, statuses=dict(sorted(statuses.items()))),
+        "endpoints": endpoints
+    }
+
+def _bucket_quantile(buckets: Dict[float, float], count: float, q: float) -> Optional[float]:
+    """Quantile estimated from cumulative histogram buckets, as Prometheus' histogram_quantile does"""
+    if count <= 0:
+        return None
+    rank = count * q / 100
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in sorted(buckets):
+        cumulative = buckets[bound]
+        if cumulative >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            if cumulative == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (cumulative - previous_count)
+        previous_bound, previous_count = bound, cumulative
+    return previous_bound
+
+def stage_breakdown(before: str, after: str, histogram: str = STAGE_HISTOGRAM) -> Dict[str, Any]:
+    """Per-label latency from the difference between two /metrics scrapes"""
+    start = parse_histograms(before, (histogram,))[histogram]
+    end = parse_histograms(after, (histogram,))[histogram]
+    stages = {}
+    for labels, series in sorted(end.items()):
+        base = start.get(labels, {'buckets': {}, 'sum': 0.0, 'count': 0})
+        count = series['count'] - base['count']
+        if count <= 0:
+            continue
+        buckets = {bound: value - base['buckets'].get(bound, 0.0) for bound, value in series['buckets'].items()}
+        name = ','.join(value for _, value in labels) or histogram
+        stages[name] = {
+            "count": int(count),
+            "mean_ms": round((series['sum'] - base['sum']) / count * 1000, 2),
+            **{f"p{q}_ms": round(_bucket_quantile(buckets, count, q) * 1000, 2) for q in (50, 95, 99)}
+        }
+    return stages
+
+def build_report(meta: Dict[str, Any], result: LoadResult, metrics_before: str, metrics_after: str,
+                 upstream_calls: Dict[str, int]) -> Dict[str, Any]:
+    """Everything one run produced, in a form later runs can be compared against"""
+    report = {"meta": meta}
+    report.update(summarize_samples(result))
+    report["stages"] = stage_breakdown(metrics_before, metrics_after)
+    report["server_requests"] = stage_breakdown(metrics_before, metrics_after, REQUEST_HISTOGRAM)
+    report["upstream_calls"] = upstream_calls
+    return report
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Plain-text tables for the terminal"""
+    meta = report["meta"]
+    overall = report["overall"]
+    lines = [
+        f"commit {meta.get('commit')}{' (dirty)' if meta.get('dirty') else ''}  "
+        f"rps {meta['config']['rps']}  duration {meta['config']['duration']}s  seed {meta['config']['seed']}  "
+        f"workers {meta['config'].get('workers', 1)}  startup {meta.get('app_startup_seconds')}s",
+        f"offered {overall['offered']}  completed {overall['count'] - overall['errors']}  errors {overall['errors']}  "
+        f"dropped {overall['dropped']}  throughput {overall['throughput_rps']} rps  statuses {overall['statuses']}",
+        "",
+        f"{'endpoint':<28}{'count':>7}{'errors':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    ]
+    for name, stats in [("overall", overall)] + list(report["endpoints"].items()):
+        lines.append(f"{name:<28}{stats['count']:>7}{stats['errors']:>7}{stats['throughput_rps']:>8}"
+                     f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}")
+    if report["stages"]:
+        lines += ["", f"{'stage (server, ms)':<28}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        for name, stats in report["stages"].items():
+            lines.append(f"{name:<28}{stats['count']:>7}{stats['mean_ms']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+    if report["upstream_calls"]:
+        lines += ["", "upstream calls: " + ", ".join(f"{name}={count}" for name, count in report["upstream_calls"].items())]
+    return "\n".join(lines)
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def compare_reports(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> str:
+    """Side by side p50/p95/p99 and throughput of two reports"""
+    lines = [
+        f"baseline  {baseline['meta'].get('commit')}  {baseline['meta'].get('timestamp')}",
+        f"candidate {candidate['meta'].get('commit')}  {candidate['meta'].get('timestamp')}"
+    ]
+    if baseline['meta'].get('config') != candidate['meta'].get('config'):
+        lines.append("warning: the runs used different settings, differences may not come from the code")
+    lines += ["", f"{'endpoint / stage':<28}{'metric':>10}{'baseline':>11}{'candidate':>11}{'change':>10}"]
+
+    def rows(section: str, keys: List[str]):
+        for name in sorted(set(baseline.get(section, {})) | set(candidate.get(section, {}))):
+            old = baseline.get(section, {}).get(name, {})
+            new = candidate.get(section, {}).get(name, {})
+            for key in keys:
+                if key in old or key in new:
+                    lines.append(f"{name:<28}{key:>10}{old.get(key, '-'):>11}{new.get(key, '-'):>11}"
+                                 f"{_change(old.get(key, 0), new.get(key, 0)):>10}")
+
+    old, new = baseline['meta'].get('app_startup_seconds', 0), candidate['meta'].get('app_startup_seconds', 0)
+    lines.append(f"{'startup':<28}{'seconds':>10}{old:>11}{new:>11}{_change(old, new):>10}")
+    old, new = baseline["overall"], candidate["overall"]
+    for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors"):
+        lines.append(f"{'overall':<28}{key:>10}{old[key]:>11}{new[key]:>11}{_change(old[key], new[key]):>10}")
+    rows("endpoints", ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"])
+    rows("stages", ["p50_ms", "p95_ms", "mean_ms"])
+    return "\n".join(lines)
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,202 @@
+"""Run the chatbot against the fake services under load and write a report
+
+    python -m bench.run --rps 20 --duration 60
+    python -m bench.run --rps 20 --duration 60 --workers 4
+    python -m bench.run --compare bench/results/a.json bench/results/b.json
+
+Each run starts the fake services and the app as separate uvicorn
+processes with a fresh SQLite database in a temporary directory, so runs
+on different commits start from the same state. With --workers the app
+runs under gunicorn with gunicorn.conf.py instead. Reports are written to
+bench/results/ named after the commit.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from bench.fixtures import build_catalog, build_queries, FIXTURE_SEED
+from bench.loadgen import LoadGenerator, DEFAULT_MIX, scrape_metrics
+from bench.report import build_report, format_report, compare_reports, load_report
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'bench', 'results')
+STARTUP_TIMEOUT = 60
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def git_state() -> Dict[str, Any]:
+    """Commit and whether the tree has uncommitted changes"""
+    def git(*args) -> str:
+        try:
+            return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {"commit": git('rev-parse', '--short', 'HEAD') or 'unknown', "dirty": bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+def start_server(target: str, port: int, env: Dict[str, str], cwd: str, log_path: str, workers: int = 1) -> subprocess.Popen:
+    log = open(log_path, 'w')
+    if workers > 1:
+        command = [sys.executable, '-m', 'gunicorn', target, '-c', os.path.join(REPO_ROOT, 'gunicorn.conf.py'), '--log-level', 'warning']
+        env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    else:
+        command = [sys.executable, '-m', 'uvicorn', target, '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+    return subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def stop_server(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def wait_ready(url: str, process: subprocess.Popen, log_path: str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    async with httpx.AsyncClient(timeout=2) as http:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                with open(log_path, 'r') as f:
+                    raise RuntimeError(f"{url} exited during startup:\n{f.read()[-3000:]}")
+            try:
+                if (await http.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready in {STARTUP_TIMEOUT}s")
+
+def service_env(args: argparse.Namespace) -> Dict[str, str]:
+    return {
+        'BENCH_SEARCH_MEDIAN_MS': str(args.search_median_ms),
+        'BENCH_SEARCH_P99_MS': str(args.search_p99_ms),
+        'BENCH_SEARCH_ERROR_RATE': str(args.search_error_rate),
+        'BENCH_OPENAI_MEDIAN_MS': str(args.openai_median_ms),
+        'BENCH_OPENAI_P99_MS': str(args.openai_p99_ms),
+        'BENCH_OPENAI_ERROR_RATE': str(args.openai_error_rate),
+        'BENCH_OPENAI_THROTTLE_RATE': str(args.openai_throttle_rate),
+        'BENCH_OPENAI_CHUNK_MS': str(args.openai_chunk_ms),
+        'BENCH_CATALOG_SIZE': str(args.catalog_size),
+        'BENCH_SEED': str(args.seed)
+    }
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='chatbot-bench-')
+    fake_port, app_port = free_port(), free_port()
+    fake_url, app_url = f"http://127.0.0.1:{fake_port}", f"http://127.0.0.1:{app_port}"
+
+    base_env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    fake_env = dict(base_env, **service_env(args))
+    # Settings from the caller's environment (cache sizes, limits...) pass through to the app
+    app_env = dict(
+        base_env,
+        AZURE_SEARCH_ENDPOINT=fake_url,
+        AZURE_SEARCH_API_KEY='bench',
+        AZURE_SEARCH_INDEX='mftleather',
+        AZURE_OPENAI_ENDPOINT=fake_url,
+        AZURE_OPENAI_API_KEY='bench',
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    )
+
+    processes: List[subprocess.Popen] = []
+    try:
+        fake_log, app_log = os.path.join(workdir, 'fake_services.log'), os.path.join(workdir, 'app.log')
+        processes.append(start_server('bench.fake_services:app', fake_port, fake_env, REPO_ROOT, fake_log))
+        await wait_ready(f"{fake_url}/_bench/calls", processes[-1], fake_log)
+
+        started = time.perf_counter()
+        processes.append(start_server('api.fastapi_app:app', app_port, app_env, workdir, app_log, args.workers))
+        await wait_ready(f"{app_url}/health", processes[-1], app_log)
+        startup_seconds = time.perf_counter() - started
+
+        queries = build_queries(build_catalog(args.catalog_size), count=args.queries, seed=FIXTURE_SEED + args.seed)
+        generator = LoadGenerator(app_url, queries, args.rps, mix=DEFAULT_MIX, sessions=args.sessions,
+                                  max_in_flight=args.max_in_flight, seed=args.seed)
+
+        # Metrics are scraped after the warmup so only measured traffic is counted
+        load_task = asyncio.create_task(generator.run(args.duration, warmup=args.warmup))
+        await asyncio.sleep(args.warmup)
+        metrics_before = await scrape_metrics(app_url)
+        result = await load_task
+        metrics_after = await scrape_metrics(app_url)
+        if args.workers > 1:
+            # Each scrape reaches whichever worker accepts it, so the deltas would mix workers
+            metrics_before = metrics_after = ''
+
+        async with httpx.AsyncClient(timeout=10) as http:
+            upstream_calls = (await http.get(f"{fake_url}/_bench/calls")).json()
+
+        meta = dict(
+            git_state(),
+            timestamp=datetime.now().isoformat(timespec='seconds'),
+            python=platform.python_version(),
+            app_startup_seconds=round(startup_seconds, 2),
+            config=dict(
+                rps=args.rps, duration=args.duration, warmup=args.warmup, seed=args.seed, sessions=args.sessions, workers=args.workers,
+                max_in_flight=args.max_in_flight, queries=args.queries, mix=DEFAULT_MIX, services=service_env(args)
+            )
+        )
+        return build_report(meta, result, metrics_before, metrics_after, upstream_calls)
+    finally:
+        for process in reversed(processes):
+            stop_server(process)
+        if args.keep_workdir:
+            print(f"Logs and database kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help='compare two saved reports and exit')
+    parser.add_argument('--rps', type=float, default=10, help='offered requests per second')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=10, help='seconds of load before measuring')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sessions', type=int, default=50, help='distinct chat sessions')
+    parser.add_argument('--queries', type=int, default=500, help='distinct messages to draw from')
+    parser.add_argument('--max-in-flight', type=int, default=500, help='requests beyond this are dropped and counted')
+    parser.add_argument('--catalog-size', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=1, help='serve the app with this many gunicorn workers')
+    parser.add_argument('--search-median-ms', type=float, default=40)
+    parser.add_argument('--search-p99-ms', type=float, default=400)
+    parser.add_argument('--search-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-median-ms', type=float, default=800)
+    parser.add_argument('--openai-p99-ms', type=float, default=4000)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--openai-chunk-ms', type=float, default=20)
+    parser.add_argument('--output', help='report path (default bench/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--keep-workdir', action='store_true', help='keep the server logs and database')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.compare:
+        print(compare_reports(load_report(args.compare[0]), load_report(args.compare[1])))
+        return
+
+    report = asyncio.run(run_benchmark(args))
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['commit']}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(format_report(report))
+    print(f"\nReport written to {output}")
+
+if __name__ == '__main__':
+    main()
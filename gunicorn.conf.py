@@ -0,0 +1,43 @@
+"""Gunicorn settings for serving the API with several uvicorn workers
+
+    gunicorn api.fastapi_app:app -c gunicorn.conf.py
+
+The master runs the schema migrations once. With preload_app it also
+imports the app and loads the catalog snapshot, policy index and query
+vocabulary before forking, so workers start warm and share those pages
+instead of each loading its own copy.
+"""
+import os
+
+# Workers skip the migrations the master already ran; set before the app is preloaded
+os.environ.setdefault('DB_MIGRATE_ON_STARTUP', 'false')
+# Conversation memory is per worker; a session's requests can land on any of them
+os.environ.setdefault('CONVERSATION_MEMORY_VALIDATE', 'true')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+# Streamed completions can run long; workers are only killed if they stop heartbeating
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+def on_starting(server):
+    from api import startup
+
+    try:
+        startup.migrate_database()
+    except Exception as e:
+        # Continue without database for backward compatibility
+        server.log.error(f"Database initialization failed: {e}")
+    if preload_app:
+        startup.preload_for_workers()
+
+def post_fork(server, worker):
+    # Connections pooled in the master must not be shared by the workers
+    from api.database import engine, async_engine
+
+    engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,56 @@
+"""Baseline schema as created by create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'chat_sessions',
+        sa.Column('session_id', sa.String(), primary_key=True),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('last_updated', sa.DateTime()),
+        sa.Column('messages', sa.JSON()),
+        sa.Column('conversation_history', sa.JSON())
+    )
+    op.create_index('ix_chat_sessions_session_id', 'chat_sessions', ['session_id'])
+
+    op.create_table(
+        'chat_messages',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.String()),
+        sa.Column('user_message', sa.Text()),
+        sa.Column('bot_response', sa.Text()),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.Column('message_id', sa.String())
+    )
+    op.create_index('ix_chat_messages_id', 'chat_messages', ['id'])
+    op.create_index('ix_chat_messages_session_id', 'chat_messages', ['session_id'])
+    op.create_index('ix_chat_messages_message_id', 'chat_messages', ['message_id'], unique=True)
+
+    op.create_table(
+        'user_feedback',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.String()),
+        sa.Column('rating', sa.String()),
+        sa.Column('feedback_text', sa.Text()),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.Column('conversation_history', sa.JSON()),
+        sa.Column('feedback_id', sa.String())
+    )
+    op.create_index('ix_user_feedback_id', 'user_feedback', ['id'])
+    op.create_index('ix_user_feedback_session_id', 'user_feedback', ['session_id'])
+    op.create_index('ix_user_feedback_feedback_id', 'user_feedback', ['feedback_id'], unique=True)
+
+def downgrade():
+    op.drop_table('user_feedback')
+    op.drop_table('chat_messages')
+    op.drop_table('chat_sessions')
@@ -0,0 +1,31 @@
+"""Timestamp indexes for the paginated session, feedback and chat history listings
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_chat_sessions_created_at', 'chat_sessions', 'created_at'),
+    ('ix_chat_sessions_last_updated', 'chat_sessions', 'last_updated'),
+    ('ix_chat_messages_timestamp', 'chat_messages', 'timestamp'),
+    ('ix_user_feedback_timestamp', 'user_feedback', 'timestamp')
+]
+
+def upgrade():
+    # Databases stamped at the baseline may already have these from create_all
+    inspector = sa.inspect(op.get_bind())
+    for name, table, column in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, [column])
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,96 @@
+"""Normalized conversation turns and feedback turn ranges
+
+Conversations move from the conversation_history JSON copies on every
+session and feedback row to one conversation_turns row per message. Turns
+are backfilled from chat_messages, two per stored message.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+def upgrade():
+    op.create_table(
+        'conversation_turns',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('turn_index', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.Text()),
+        sa.Column('timestamp', sa.DateTime()),
+        sa.UniqueConstraint('session_id', 'turn_index', name='uq_conversation_turns_session_turn')
+    )
+    op.add_column('chat_sessions', sa.Column('turn_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('user_feedback', sa.Column('turn_start', sa.Integer()))
+    op.add_column('user_feedback', sa.Column('turn_end', sa.Integer()))
+    op.create_index('ix_chat_messages_session_id_timestamp', 'chat_messages', ['session_id', 'timestamp'])
+
+    backfill_turns()
+
+def backfill_turns():
+    bind = op.get_bind()
+    chat_sessions = sa.table('chat_sessions', sa.column('session_id'), sa.column('turn_count'))
+    chat_messages = sa.table(
+        'chat_messages', sa.column('id'), sa.column('session_id'), sa.column('user_message'),
+        sa.column('bot_response'), sa.column('timestamp')
+    )
+    user_feedback = sa.table(
+        'user_feedback', sa.column('id'), sa.column('session_id'), sa.column('timestamp'),
+        sa.column('turn_start'), sa.column('turn_end')
+    )
+    conversation_turns = sa.table(
+        'conversation_turns', sa.column('session_id'), sa.column('turn_index'), sa.column('role'),
+        sa.column('content'), sa.column('timestamp')
+    )
+
+    turn_counts = {}
+    batch = []
+    messages = bind.execute(
+        sa.select(chat_messages)
+        .where(chat_messages.c.session_id.isnot(None))
+        .order_by(chat_messages.c.session_id, chat_messages.c.timestamp, chat_messages.c.id)
+    )
+    for message in messages:
+        turn_index = turn_counts.get(message.session_id, 0)
+        batch.append({"session_id": message.session_id, "turn_index": turn_index, "role": "user",
+                      "content": message.user_message, "timestamp": message.timestamp})
+        batch.append({"session_id": message.session_id, "turn_index": turn_index + 1, "role": "assistant",
+                      "content": message.bot_response, "timestamp": message.timestamp})
+        turn_counts[message.session_id] = turn_index + 2
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            bind.execute(conversation_turns.insert(), batch)
+            batch = []
+    if batch:
+        bind.execute(conversation_turns.insert(), batch)
+
+    for session_id, turn_count in turn_counts.items():
+        bind.execute(
+            chat_sessions.update().where(chat_sessions.c.session_id == session_id).values(turn_count=turn_count)
+        )
+
+    # Existing feedback covers every turn stored before it was given
+    turns_before = (
+        sa.select(sa.func.count(chat_messages.c.id) * 2)
+        .where(chat_messages.c.session_id == user_feedback.c.session_id)
+        .where(chat_messages.c.timestamp <= user_feedback.c.timestamp)
+        .scalar_subquery()
+    )
+    bind.execute(user_feedback.update().values(turn_start=0, turn_end=turns_before))
+
+def downgrade():
+    op.drop_index('ix_chat_messages_session_id_timestamp', table_name='chat_messages')
+    with op.batch_alter_table('user_feedback') as batch_op:
+        batch_op.drop_column('turn_end')
+        batch_op.drop_column('turn_start')
+    with op.batch_alter_table('chat_sessions') as batch_op:
+        batch_op.drop_column('turn_count')
+    op.drop_table('conversation_turns')
@@ -1,7 +1,9 @@
 #!/bin/bash
 
-# Create tables if they don't exist
-python -c "from api.database import create_tables; create_tables()"
+# Several workers: gunicorn runs the migrations once in its master and forks warm workers
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    exec gunicorn api.fastapi_app:app -c gunicorn.conf.py
+fi
 
-# Start the FastAPI application
-uvicorn api.fastapi_app:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# Single worker: the app runs the migrations in its startup
+exec uvicorn api.fastapi_app:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""since/until bounds on the feedback listing, for the database and the legacy store"""
+from datetime import datetime, timezone, timedelta
+import os
+import tempfile
+
+# The app reads its settings at import
+_workdir = tempfile.mkdtemp(prefix='chatbot-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.setdefault('AZURE_OPENAI_API_KEY', 'test')
+os.environ.setdefault('AZURE_OPENAI_ENDPOINT', 'http://127.0.0.1:9')
+
+import pytest
+from fastapi.testclient import TestClient
+from api.database import create_tables
+from api import fastapi_app
+from api.fastapi_app import app, json_stores, save_batch_to_database, utc_naive
+
+@pytest.fixture(scope='module')
+def client():
+    previous = os.getcwd()
+    os.chdir(_workdir)
+    create_tables()
+    save_batch_to_database([
+        ('s1', {'rating': 'like', 'feedback': 'before', 'conversation_history': [], 'timestamp_utc': datetime(2024, 4, 30, 12)}, 'feedback'),
+        ('s1', {'rating': 'like', 'feedback': 'after', 'conversation_history': [], 'timestamp_utc': datetime(2024, 5, 1, 12)}, 'feedback')
+    ])
+    json_stores['feedback.json'].append({'rating': 'like', 'feedback': 'legacy before', 'created_at': '2024-04-30T12:00:00'})
+    json_stores['feedback.json'].append({'rating': 'like', 'feedback': 'legacy after', 'created_at': '2024-05-01T12:00:00'})
+    try:
+        yield TestClient(app)
+    finally:
+        os.chdir(previous)
+
+def test_utc_naive_converts_aware_bounds():
+    assert utc_naive(datetime(2024, 5, 1, 3, tzinfo=timezone(timedelta(hours=3)))) == datetime(2024, 5, 1)
+    assert utc_naive(datetime(2024, 5, 1)) == datetime(2024, 5, 1)
+    assert utc_naive(None) is None
+
+def test_z_suffixed_bounds_are_naive_in_sql():
+    filters = fastapi_app.history_filters(fastapi_app.UserFeedback, None, utc_naive(datetime(2024, 5, 1, tzinfo=timezone.utc)), None)
+    assert filters[0].right.value.tzinfo is None
+
+def test_z_suffixed_bounds_filter_both_sources(client):
+    # The bound equals the later records' timestamps, which must be included
+    response = client.get('/api/feedback', params={'since': '2024-05-01T12:00:00Z', 'until': '2024-05-02T00:00:00Z'})
+    assert response.status_code == 200
+    texts = sorted(row.get('feedback_text') or row.get('feedback') for row in response.json()['feedback'])
+    assert texts == ['after', 'legacy after']